@@ -17,11 +17,15 @@
 # Import standard libraries
 import os
 import sys
+import fcntl
+import shutil
+import hashlib
 import logging
 import datetime
 import functools
 import subprocess as sp
 from pathlib import Path
+from tempfile import gettempdir
 from tempfile import NamedTemporaryFile
 from tempfile import TemporaryDirectory
 from concurrent.futures import ProcessPoolExecutor
@@ -72,6 +76,7 @@ DEPENDENCIES_FROM_REPO = (
     "PATH/TO/REPO/FILE2",
     # ...
 )
+GIT_ASSETS_CACHE = Path(gettempdir(), 'vogeler-git-assets')
 
 
 # Functions
@@ -223,26 +228,69 @@ def cmd_pipe(cmds, stdin=None) -> None:
 
 def import_scripts(
     repo_path: Path, repo_commit: str, repo_assets: list[Path], dst_dir: Path,
+    cache_dir: Path = GIT_ASSETS_CACHE,
 ) -> None:
-    """Use git to copy dependency scripts to another directory."""
+    """
+    Use git to copy dependency scripts to another directory. Assets are
+    extracted once per commit into a node-local, content-addressed cache
+    (atomically, under a file lock) and hardlinked (or symlinked) into
+    dst_dir.
+    """
     log.info(f"Git repo path: {repo_path}")
     log.info(f"Git repo commit: {repo_commit}")
 
+    # Key cache entry by full commit hash and asset list
+    commit = sp.run(
+        ['git', '-C', repo_path, 'rev-parse', '--verify',
+            f"{repo_commit}^{{commit}}"],
+        check=True, text=True, capture_output=True,
+    ).stdout.strip()
+    key = hashlib.sha256(
+        '\0'.join([commit, *sorted(str(a) for a in repo_assets)]).encode()
+    ).hexdigest()
+    entry = Path(cache_dir, key)
+
+    # Extract assets into cache, unless another job already did
+    if not entry.exists():
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        with open(Path(cache_dir, f"{key}.lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not entry.exists():
+                tmp_dir = Path(cache_dir, f".{key}.{os.getpid()}.tmp")
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                tmp_dir.mkdir()
+                git_cmd = ('git',
+                    '-C', repo_path,
+                    'archive',
+                        '--format', 'tar',
+                        commit,
+                        *repo_assets,
+                )
+                tar_cmd = ('tar',
+                    '--directory', str(tmp_dir),
+                    '--file', '-',
+                    '--extract',
+                )
+                cmd_pipe([git_cmd, tar_cmd])
+                for root, _, files in os.walk(tmp_dir):
+                    for name in files:
+                        path = os.path.join(root, name)
+                        os.chmod(path, os.stat(path).st_mode & ~0o222)
+                tmp_dir.rename(entry)
+
+    # Hardlink cached assets into destination (symlink across file systems)
     dst_dir.mkdir(parents=True, exist_ok=True)
-
-    git_cmd = ('git',
-        '-C', repo_path,
-        'archive',
-            '--format', 'tar',
-            repo_commit,
-            *repo_assets,
-    )
-    tar_cmd = ('tar',
-        '--directory', str(dst_dir),
-        '--file', '-',
-        '--extract',
-    )
-    cmd_pipe([git_cmd, tar_cmd])
+    for root, _, files in os.walk(entry):
+        rel_root = os.path.relpath(root, entry)
+        Path(dst_dir, rel_root).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            src = Path(root, name)
+            dst = Path(dst_dir, rel_root, name)
+            dst.unlink(missing_ok=True)
+            try:
+                os.link(src, dst)
+            except OSError:
+                dst.symlink_to(src.absolute())
 
 def gdal_build_vrt(src_paths: list[Path], dst_pth: Path) -> None:
     """Create virtual mosaic from a list of rasters."""
@@ -0,0 +1,149 @@
+# Author: Daniel Rode
+# Dependencies:
+#   python 3.10+
+#   pytest
+
+
+# Description: Shared fixtures for the vogeler library tests. Run from the
+# repository root with "python -m pytest lib/py/tests".
+
+
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+# Import libraries
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+# Import standard libraries
+import sys
+import struct
+from pathlib import Path
+
+# Import external libraries
+import pytest
+
+
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+DATA_DIR = Path(__file__).parent / 'data'
+
+# Make vogeler importable without installing it
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+def write_las(
+    las_path: Path,
+    points: list[tuple],
+    epsg=26913,
+    scale=0.01,
+    offset=(0, 0, 0),
+    point_format=0,
+) -> Path:
+    """Write a minimal LAS 1.2 file of the given points.
+
+    Points are (x, y, z) or (x, y, z, return_num, num_returns) tuples. The
+    CRS is stored as a GeoTIFF GeoKey VLR with a projected EPSG code. The
+    same "scale" is used for all three coordinates.
+    """
+
+    record_len = {0: 20, 1: 28}[point_format]
+    header_size = 227
+
+    # GeoKeyDirectory VLR holding the projected CRS code
+    keys = struct.pack('<8H', 1, 1, 0, 1, 3072, 0, 1, epsg)
+    vlr = struct.pack(
+        '<H16sHH32s', 0, b'LASF_Projection', 34735, len(keys), b'',
+    ) + keys
+
+    xs, ys, zs = ([p[i] for p in points] for i in range(3))
+    count_by_return = [0] * 5
+    body = bytearray()
+    for p in points:
+        return_num, num_returns = (p[3], p[4]) if len(p) > 3 else (1, 1)
+        count_by_return[return_num - 1] += 1
+        record = bytearray(record_len)
+        struct.pack_into(
+            '<3i', record, 0,
+            *(round((v - o) / scale) for v, o in zip(p[:3], offset)),
+        )
+        record[14] = return_num | (num_returns << 3)
+        body += record
+
+    header = bytearray(header_size)
+    header[0:4] = b'LASF'
+    struct.pack_into('<BB', header, 24, 1, 2)
+    struct.pack_into('<HHH', header, 90, 1, 2024, header_size)
+    struct.pack_into('<II', header, 96, header_size + len(vlr), 1)
+    struct.pack_into('<BH', header, 104, point_format, record_len)
+    struct.pack_into('<I5I', header, 107, len(points), *count_by_return)
+    struct.pack_into('<3d', header, 131, scale, scale, scale)
+    struct.pack_into('<3d', header, 155, *offset)
+    if points:
+        struct.pack_into(
+            '<6d', header, 179,
+            max(xs), min(xs), max(ys), min(ys), max(zs), min(zs),
+        )
+
+    Path(las_path).write_bytes(bytes(header) + vlr + bytes(body))
+    return Path(las_path)
+
+
+def write_tif(
+    tif_path: Path,
+    pixels,
+    origin=(500000, 4400000),
+    res=1.0,
+    crs='EPSG:26913',
+    nodata=None,
+    **kwargs,
+) -> Path:
+    """Write a GeoTIFF of a (bands, rows, cols) or (rows, cols) array.
+
+    The raster's top-left corner is at "origin", with square pixels of size
+    "res". Extra keyword arguments go to the GeoTIFF profile.
+    """
+
+    import numpy as np
+    import rasterio as rio
+    from rasterio.transform import from_origin
+
+    pixels = np.asarray(pixels)
+    if pixels.ndim == 2:
+        pixels = pixels[np.newaxis]
+    profile = {
+        'driver': 'GTiff',
+        'count': pixels.shape[0],
+        'height': pixels.shape[1],
+        'width': pixels.shape[2],
+        'dtype': pixels.dtype,
+        'crs': crs,
+        'transform': from_origin(*origin, res, res),
+        'nodata': nodata,
+        **kwargs,
+    }
+    with rio.open(tif_path, 'w', **profile) as f:
+        f.write(pixels)
+    return Path(tif_path)
+
+
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+@pytest.fixture
+def extlib():
+    """Import vogeler.extlib, skipping if its dependencies are missing."""
+
+    return pytest.importorskip('vogeler.extlib')
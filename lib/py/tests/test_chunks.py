@@ -0,0 +1,103 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the chunked processing functions in vogeler.extlib.
+
+
+import json
+
+import shapely
+from geopandas import GeoDataFrame
+
+
+def write_chunk(job):
+    """Chunk worker: write the chunk's core box and log the run."""
+
+    GeoDataFrame(
+        {'name': [job['chunk_id']]},
+        geometry=[shapely.box(*job['core_bounds'])],
+        crs='EPSG:26913',
+    ).to_file(job['out_path'])
+    with open(f"{job['out_path']}.runs", 'a') as f:
+        f.write('x')
+    return len(job['paths'])
+
+
+def runs(out_dir):
+    return {
+        p.name.split('.')[0]: len(p.read_text())
+        for p in out_dir.glob('*.runs')
+    }
+
+
+def test_chunk_grid_ids_are_absolute(extlib):
+    a = extlib.chunk_grid((0, 0, 200, 100), 100, buffer=10)
+    b = extlib.chunk_grid((-150, 50, 150, 150), 100, buffer=10)
+    assert list(a['chunk_id']) == ['r0000_c0000', 'r0000_c0001']
+    assert list(b['chunk_id']) == [
+        'r0000_c-002', 'r0000_c-001', 'r0000_c0000', 'r0000_c0001',
+        'r0001_c-002', 'r0001_c-001', 'r0001_c0000', 'r0001_c0001',
+    ]
+
+    # Same id, same square, whichever area it came from
+    core_a = a.set_index('chunk_id')['core']
+    core_b = b.set_index('chunk_id')['core']
+    assert core_a['r0000_c0001'].equals(core_b['r0000_c0001'])
+    assert a.geometry.iloc[0].bounds == (-10, -10, 110, 110)
+
+
+def test_run_chunks_checkpoints(extlib, tmp_path):
+    out_dir = tmp_path / 'out'
+    chunks = extlib.chunk_grid((0, 0, 200, 100), 100, buffer=10)
+    chunks['paths'] = [['a.las'], ['a.las', 'b.las']]
+
+    jobs = extlib.run_chunks(chunks, write_chunk, out_dir, '.gpkg', 1)
+    assert {k: j['result'] for k, j in jobs.items()} == {
+        'r0000_c0000': 1, 'r0000_c0001': 2,
+    }
+    record = json.loads((out_dir / 'r0000_c0001.done.json').read_text())
+    assert record['core_bounds'] == [100, 0, 200, 100]
+    assert record['paths'] == ['a.las', 'b.las']
+
+    # Finished chunks are skipped on a rerun
+    jobs = extlib.run_chunks(chunks, write_chunk, out_dir, '.gpkg', 1)
+    assert runs(out_dir) == {'r0000_c0000': 1, 'r0000_c0001': 1}
+    assert jobs['r0000_c0001']['result'] == 2
+
+    # Chunks whose tiles or bounds changed are run again
+    chunks['paths'] = [['a.las'], ['b.las']]
+    extlib.run_chunks(chunks, write_chunk, out_dir, '.gpkg', 1)
+    assert runs(out_dir) == {'r0000_c0000': 1, 'r0000_c0001': 2}
+    chunks = extlib.chunk_grid((0, 0, 200, 100), 100, buffer=20)
+    chunks['paths'] = [['a.las'], ['b.las']]
+    extlib.run_chunks(chunks, write_chunk, out_dir, '.gpkg', 1)
+    assert runs(out_dir) == {'r0000_c0000': 2, 'r0000_c0001': 3}
+
+
+def test_merge_chunks_dedupe(extlib, tmp_path):
+    # Both chunks see the crown on their shared edge, with other outlines
+    cores = [(0, 0, 100, 100), (100, 0, 200, 100)]
+    outputs = [
+        [('t1', shapely.box(10, 10, 20, 20)),
+         ('t2', shapely.box(90, 40, 104, 50))],
+        [('t2', shapely.box(96, 40, 110, 50)),
+         ('t3', shapely.box(150, 10, 160, 20))],
+    ]
+    jobs = []
+    for i, (core, features) in enumerate(zip(cores, outputs)):
+        out_path = tmp_path / f"{i}.gpkg"
+        names, geoms = zip(*features)
+        GeoDataFrame(
+            {'tree_id': names}, geometry=list(geoms), crs='EPSG:26913',
+        ).to_file(out_path)
+        jobs.append({'out_path': out_path, 'core_bounds': core})
+
+    # Representative points of the two outlines fall in different cores
+    assert sorted(extlib.merge_chunks(jobs)['tree_id']) == [
+        't1', 't2', 't2', 't3',
+    ]
+
+    # A stable id keeps each feature once
+    gdf = extlib.merge_chunks(jobs, id_col='tree_id')
+    assert sorted(gdf['tree_id']) == ['t1', 't2', 't3']
+    assert gdf.set_index('tree_id').geometry['t2'].bounds == (90, 40, 104, 50)
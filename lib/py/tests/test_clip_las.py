@@ -0,0 +1,145 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the in-process point cloud clipping in
+# vogeler.extlib.
+
+
+import shutil
+
+import numpy as np
+import pytest
+import shapely
+
+from conftest import write_las
+
+
+# Tiles side by side and a polygon straddling both of them
+TILE_ORIGINS = [(500000, 4400000), (500100, 4400000)]
+POLYGON = shapely.Polygon([
+    (500040, 4400010), (500170, 4400030), (500150, 4400090),
+    (500080, 4400070), (500030, 4400060),
+])
+
+
+@pytest.fixture
+def tiles(tmp_path):
+    """Write two tiles of random points and return their paths and points."""
+
+    rng = np.random.default_rng(42)
+    paths, points = [], []
+    for i, (x0, y0) in enumerate(TILE_ORIGINS):
+        pts = np.round(np.column_stack([
+            rng.uniform(x0, x0 + 100, 500),
+            rng.uniform(y0, y0 + 100, 500),
+            rng.uniform(0, 50, 500),
+        ]), 2)
+        paths.append(write_las(tmp_path / f"tile{i}.las", pts.tolist()))
+        points.append(pts)
+    return paths, np.concatenate(points)
+
+
+def read_xyz(extlib, las_path):
+    pts = extlib.las_points(las_path)
+    return np.column_stack([pts['x'], pts['y'], pts['z']])
+
+
+def test_clip_las_points_and_header(extlib, tiles, tmp_path):
+    from vogeler.stdlib import read_las_header
+
+    paths, points = tiles
+    dst = tmp_path / 'clip.las'
+    extlib.clip_las(paths, POLYGON, dst, chunk_size=64, max_workers=4)
+
+    # Points inside polygon, in tile then file order
+    inside = shapely.intersects_xy(POLYGON, points[:, 0], points[:, 1])
+    expected = points[inside]
+    assert np.allclose(read_xyz(extlib, dst), expected)
+
+    header = read_las_header(dst)
+    assert header['point_count'] == len(expected)
+    assert header['min'] == pytest.approx(tuple(expected.min(axis=0)))
+    assert header['max'] == pytest.approx(tuple(expected.max(axis=0)))
+
+
+def test_clip_las_multiple_polygons(extlib, tiles, tmp_path):
+    paths, points = tiles
+    polygons = [POLYGON, shapely.box(500000, 4400000, 500010, 4400010)]
+    dsts = [tmp_path / 'a.las', tmp_path / 'b.las']
+    extlib.clip_las(paths, polygons, dsts)
+
+    for poly, dst in zip(polygons, dsts):
+        inside = shapely.intersects_xy(poly, points[:, 0], points[:, 1])
+        assert np.allclose(read_xyz(extlib, dst), points[inside])
+
+
+def test_clip_las_is_reproducible(extlib, tiles, tmp_path):
+    paths, _ = tiles
+    outputs = []
+    for i in range(3):
+        dst = tmp_path / f"clip{i}.las"
+        extlib.clip_las(paths, POLYGON, dst, chunk_size=16, max_workers=4)
+        outputs.append(dst.read_bytes())
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+@pytest.mark.skipif(shutil.which('Rscript') is None, reason="R not installed")
+def test_clip_las_matches_lidr(extlib, tiles, tmp_path):
+    from vogeler.stdlib import read_las_header
+    lidr = pytest.importorskip('vogeler.lidr')
+
+    paths, _ = tiles
+    ours_path = tmp_path / 'ours.las'
+    theirs_path = tmp_path / 'theirs.las'
+    extlib.clip_las(paths, POLYGON, ours_path)
+    lidr.clip_las(paths, POLYGON, theirs_path)
+
+    # Same point set (lidR may order points differently)
+    ours = read_xyz(extlib, ours_path)
+    theirs = read_xyz(extlib, theirs_path)
+    assert np.allclose(
+        ours[np.lexsort(ours.T)], theirs[np.lexsort(theirs.T)],
+    )
+
+    ours_header = read_las_header(ours_path)
+    theirs_header = read_las_header(theirs_path)
+    assert ours_header['point_count'] == theirs_header['point_count']
+    assert ours_header['min'] == pytest.approx(theirs_header['min'])
+    assert ours_header['max'] == pytest.approx(theirs_header['max'])
+
+
+def test_clip_las_keeps_edge_points(extlib, tmp_path):
+    square = shapely.box(500010, 4400010, 500020, 4400020)
+    points = [
+        (500010, 4400010, 1),  # Corner
+        (500015, 4400020, 2),  # Top edge
+        (500020, 4400015, 3),  # Right edge
+        (500015, 4400015, 4),  # Inside
+        (500020.01, 4400015, 5),  # Just outside
+    ]
+    src = write_las(tmp_path / 'tile.las', points)
+    dst = tmp_path / 'clip.las'
+    extlib.clip_las(src, square, dst)
+
+    assert np.allclose(read_xyz(extlib, dst), points[:4])
+
+
+def test_clip_las_rescales_tiles(extlib, tiles, tmp_path):
+    from vogeler.stdlib import read_las_header
+
+    # Rewrite second tile with a finer scale and another offset
+    paths, points = tiles
+    second = points[len(points) // 2:]
+    write_las(
+        paths[1], second.tolist(), scale=0.001, offset=(500100, 4400000, 0),
+    )
+    dst = tmp_path / 'clip.las'
+    extlib.clip_las(paths, POLYGON, dst)
+
+    # Output uses the first tile's scale and offset
+    header = read_las_header(dst)
+    assert header['scale'] == (0.01, 0.01, 0.01)
+    assert header['offset'] == (0, 0, 0)
+    inside = shapely.intersects_xy(POLYGON, points[:, 0], points[:, 1])
+    assert np.allclose(read_xyz(extlib, dst), points[inside])
+    assert header['point_count'] == inside.sum()
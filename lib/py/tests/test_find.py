@@ -0,0 +1,36 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the file search functions in vogeler.stdlib.
+
+
+import os
+
+from vogeler.stdlib import find
+
+
+def test_find_empty_skips_unreadable(tmp_path, monkeypatch):
+    (tmp_path / 'empty_dir').mkdir()
+    (tmp_path / 'locked_dir').mkdir()
+    (tmp_path / 'empty.txt').touch()
+    (tmp_path / 'gone.txt').touch()
+    (tmp_path / 'full.txt').write_text('x')
+
+    # Entries that fail to be read are left out, one by one
+    listdir, getsize = os.listdir, os.path.getsize
+
+    def fake_listdir(path):
+        if path.endswith('locked_dir'):
+            raise PermissionError(path)
+        return listdir(path)
+
+    def fake_getsize(path):
+        if path.endswith('gone.txt'):
+            raise FileNotFoundError(path)
+        return getsize(path)
+
+    monkeypatch.setattr(os, 'listdir', fake_listdir)
+    monkeypatch.setattr(os.path, 'getsize', fake_getsize)
+
+    found = find('', [tmp_path], result_type=['e'], max_workers=1)
+    assert sorted(p.name for p in found) == ['empty.txt', 'empty_dir']
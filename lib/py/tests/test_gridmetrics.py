@@ -0,0 +1,98 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the GridMetrics engine in vogeler.extlib.
+
+
+import numpy as np
+
+from conftest import write_las
+
+
+def block_products(extlib, las_path, height_break=None):
+    """Compute GridMetrics products of a single 20 ft cell at the origin."""
+
+    if height_break is None:
+        height_break = extlib.GRIDMET_HEIGHT_BREAK
+    return extlib.gridmetrics_block(
+        [las_path],
+        origin=(0, 20),
+        shape=(1, 1),
+        cell_size=20,
+        height_break=height_break,
+        min_points=1,
+        kde_step=1.0,
+        kde_bandwidth=2.0,
+        rumple_res=1.0,
+    )
+
+
+def test_strata_keys_match_naming_map(extlib):
+    from vogeler.stdlib import NAMING_MAP
+
+    strata = {
+        f"gridmet20m_strat_{pop}_"
+        f"{round(lo * 10):04d}to{round(hi * 10):04d}.tif"
+        for lo, hi in extlib.GRIDMET_STRATA
+        for pop in ('all', 'frst')
+    }
+    assert strata == {k for k in NAMING_MAP if '_strat_' in k}
+
+
+def test_strata_are_in_feet(extlib, tmp_path):
+    las_path = write_las(tmp_path / 'a.las', [
+        (5, 5, 0.7),
+        (6, 6, 3.0),
+        (7, 7, 12.0),
+        (8, 8, 165.0, 2, 2),
+    ])
+    products = block_products(extlib, las_path)
+
+    assert products['strat_all_0005to0010'][0, 0] == 1
+    assert products['strat_all_0010to0045'][0, 0] == 1
+    assert products['strat_all_0100to0200'][0, 0] == 1
+    assert products['strat_all_1600to1700'][0, 0] == 1
+    assert products['strat_frst_1600to1700'][0, 0] == 0
+    assert products['strat_all_0000to0005'][0, 0] == 0
+
+
+def test_height_break_is_4p5_ft(extlib, tmp_path):
+    assert extlib.GRIDMET_HEIGHT_BREAK == 4.5
+
+    # Only points above 4.5 ft are in the "hp" populations
+    las_path = write_las(tmp_path / 'a.las', [
+        (5, 5, 1.0),
+        (6, 6, 5.0),
+        (7, 7, 6.0),
+    ])
+    products = block_products(extlib, las_path)
+
+    assert products['hp_count'][0, 0] == 2
+    assert products['frsthp_z_min_ft'][0, 0] == np.float32(5.0)
+    assert products['density_cc'][0, 0] == np.float32(100 * 2 / 3)
+
+
+def test_kde_peaks_per_cell_range(extlib):
+    # Cell 0 has modes near 10 and 40 ft; cell 1 is one noisy column
+    rng = np.random.default_rng(0)
+    z0 = np.concatenate([rng.normal(10, 1, 200), rng.normal(40, 1, 300)])
+    cell = np.zeros(len(z0), dtype=np.int64)
+    alone = extlib.kde_peaks(cell, z0, 2)
+    assert alone['kde_peaks_count'][0] == 2
+    assert abs(alone['kde_peak1_elev_ft'][0] - 40) < 1.5
+    assert abs(alone['kde_peak2_elev_ft'][0] - 10) < 1.5
+    assert np.isnan(alone['kde_peaks_count'][1])
+
+    # Noise points far away in another cell leave cell 0's peaks in place
+    # (up to the shift of the bin grid)
+    z1 = np.array([-900.0, 20.0, 21.0, 5000.0])
+    both = extlib.kde_peaks(
+        np.concatenate([cell, np.ones(len(z1), dtype=np.int64)]),
+        np.concatenate([z0, z1]),
+        2,
+    )
+    assert both['kde_peaks_count'][0] == 2
+    for k in ('kde_peak1_elev_ft', 'kde_peak2_elev_ft'):
+        assert abs(both[k][0] - alone[k][0]) <= 1
+    assert both['kde_peaks_count'][1] == 3
+    assert both['kde_peak1_elev_ft'][1] == 5000.5
@@ -0,0 +1,116 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for queued logging in vogeler.stdlib.
+
+
+import sys
+import logging
+
+import pytest
+
+from vogeler.stdlib import dispatch
+from vogeler.stdlib import init_logger
+from vogeler.stdlib import stop_log_listener
+
+
+log = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def root_logger():
+    """Restore the root logger's handlers and level after a test."""
+
+    logger = logging.getLogger()
+    handlers, level = list(logger.handlers), logger.level
+    excepthook = sys.excepthook
+    yield logger
+    stop_log_listener(reattach=False)
+    for h in list(logger.handlers):
+        if h not in handlers:
+            logger.removeHandler(h)
+            h.close()
+    logger.setLevel(level)
+    sys.excepthook = excepthook
+
+
+def own_handlers(logger):
+    """List handlers of the logging package (not those of pytest)."""
+
+    return [
+        type(h).__name__ for h in logger.handlers
+        if type(h).__module__.startswith('logging')
+    ]
+
+
+def tick(n):
+    for _ in range(n):
+        log.info("tick")
+    return n
+
+
+def test_queued_logging_tags_jobs(root_logger, tmp_path):
+    log_path = tmp_path / 'run.log'
+    init_logger(log_path, queued=True)
+    log.info("parent")
+    results = list(dispatch([1, 2], tick, max_workers=2))
+    stop_log_listener()
+
+    lines = log_path.read_text().splitlines()
+    assert sorted(r for _, r in results) == [1, 2]
+    assert sum('job -] parent' in line for line in lines) == 1
+    assert sum('job 0] tick' in line for line in lines) == 1
+    assert sum('job 1] tick' in line for line in lines) == 2
+
+
+def test_rate_limit_reports_suppressed(root_logger, tmp_path):
+    log_path = tmp_path / 'run.log'
+    init_logger(log_path, queued=True, rate=1)
+
+    # Limit applies across all worker processes
+    list(dispatch([100, 100, 100], tick, max_workers=3))
+    stop_log_listener()
+
+    # Records dropped at the end of the burst are still reported
+    lines = log_path.read_text().splitlines()
+    ticks = [line for line in lines if 'tick' in line]
+    notices = [line for line in ticks if 'similar suppressed' in line]
+    suppressed = sum(int(line.split('[')[-1].split()[0]) for line in notices)
+    assert len(ticks) < 100
+    assert notices
+    assert len(ticks) - len(notices) + suppressed == 300
+
+
+def tick_numbered(n):
+    for i in range(n):
+        log.info("tick %d of %d", i, n)
+    return n
+
+
+def test_rate_limit_by_template(root_logger, tmp_path):
+    log_path = tmp_path / 'run.log'
+    init_logger(log_path, queued=True, rate=1)
+
+    # Records differing only in their arguments share one limit
+    list(dispatch([100, 100], tick_numbered, max_workers=2))
+    stop_log_listener()
+
+    lines = log_path.read_text().splitlines()
+    ticks = [line for line in lines if 'tick' in line]
+    notices = [line for line in ticks if 'similar suppressed' in line]
+    suppressed = sum(int(line.split('[')[-1].split()[0]) for line in notices)
+    assert len(ticks) < 100
+    assert len(ticks) - len(notices) + suppressed == 200
+    assert any(' of 100' in line for line in notices)
+
+
+def test_init_logger_twice(root_logger, tmp_path):
+    log_path = tmp_path / 'run.log'
+    init_logger(log_path, queued=True)
+    init_logger(log_path, queued=True)
+    assert own_handlers(root_logger) == ['QueueHandler']
+
+    log.info("once")
+    stop_log_listener()
+    assert own_handlers(root_logger) == ['StreamHandler', 'FileHandler']
+    assert log_path.read_text().count("once") == 1
@@ -0,0 +1,146 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the file cache (memoize_files) in vogeler.stdlib.
+
+
+import os
+import threading
+
+import pytest
+
+import vogeler.stdlib
+from vogeler.stdlib import memoize_files
+from vogeler.stdlib import set_file_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Point the file cache at a fresh directory for one test."""
+
+    monkeypatch.setattr(vogeler.stdlib, 'FILE_CACHE_DIR', None)
+    monkeypatch.setattr(vogeler.stdlib, 'FILE_CACHE_MAX_BYTES', 2**30)
+    cache_dir = tmp_path / 'cache'
+    set_file_cache(cache_dir)
+    return cache_dir
+
+
+calls = []
+
+
+@memoize_files('out_path')
+def upper(in_path, out_path, suffix=''):
+    calls.append(in_path)
+    text = open(in_path).read().upper() + suffix
+    with open(out_path, 'w') as f:
+        f.write(text)
+    return len(text)
+
+
+def entries(cache_dir):
+    return [p for p in cache_dir.iterdir() if not p.name.startswith('.')]
+
+
+def test_memoize_hit(cache_dir, tmp_path):
+    calls.clear()
+    src = tmp_path / 'in.txt'
+    src.write_text('abc')
+
+    assert upper(src, tmp_path / 'a.txt') == 3
+    assert upper(src, tmp_path / 'b.txt') == 3
+    assert len(calls) == 1
+    assert (tmp_path / 'b.txt').read_text() == 'ABC'
+
+    # Other argument values are other entries
+    upper(src, tmp_path / 'c.txt', suffix='!')
+    assert len(calls) == 2
+    assert (tmp_path / 'c.txt').read_text() == 'ABC!'
+    assert len(entries(cache_dir)) == 2
+
+
+def test_memoize_invalidation(cache_dir, tmp_path):
+    calls.clear()
+    src = tmp_path / 'in.txt'
+    src.write_text('abc')
+    upper(src, tmp_path / 'a.txt')
+
+    # Changed input misses the cache
+    src.write_text('abcd')
+    os.utime(src, (1, 1))
+    assert upper(src, tmp_path / 'b.txt') == 4
+    assert (tmp_path / 'b.txt').read_text() == 'ABCD'
+    assert len(calls) == 2
+
+    # Damaged cache entry is dropped and recomputed
+    for entry in entries(cache_dir):
+        for p in entry.glob('out_path.*'):
+            p.unlink()
+    assert upper(src, tmp_path / 'c.txt') == 4
+    assert len(calls) == 3
+
+
+def test_memoize_eviction(cache_dir, tmp_path, monkeypatch):
+    calls.clear()
+    monkeypatch.setattr(vogeler.stdlib, 'FILE_CACHE_MAX_BYTES', 10)
+    srcs = []
+    for i, text in enumerate(['aaaa', 'bbbb', 'cccc']):
+        srcs.append(tmp_path / f"in{i}.txt")
+        srcs[-1].write_text(text)
+        upper(srcs[-1], tmp_path / f"out{i}.txt")
+
+        # Backdate the new entry's last use, oldest first
+        os.utime(next(
+            e / 'manifest.json' for e in entries(cache_dir)
+            if (e / 'manifest.json').stat().st_mtime > 100
+        ), (i, i))
+
+    # Least recently used entry went first
+    assert len(entries(cache_dir)) == 2
+    upper(srcs[0], tmp_path / 'again.txt')
+    assert calls.count(srcs[0]) == 2
+    upper(srcs[2], tmp_path / 'again.txt')
+    assert calls.count(srcs[2]) == 1
+
+
+def test_memoize_threads(cache_dir, tmp_path):
+    src = tmp_path / 'in.txt'
+    src.write_text('abc')
+
+    # Threads storing the same entry at once do not trip over each other
+    errors = []
+
+    def run(i):
+        try:
+            upper(src, tmp_path / f"out{i}.txt")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(entries(cache_dir)) == 1
+    assert not [p for p in cache_dir.iterdir() if p.name.startswith('.')]
+    for i in range(8):
+        assert (tmp_path / f"out{i}.txt").read_text() == 'ABC'
+
+
+def test_memoize_skips_in_memory(cache_dir, tmp_path):
+    calls.clear()
+    src = tmp_path / 'in.txt'
+    src.write_text('abc')
+
+    @memoize_files('out_path')
+    def concat(in_paths, out_path, opts=None):
+        calls.append(in_paths)
+        with open(out_path, 'w') as f:
+            f.write('x')
+
+    # In-memory datasets nested in lists or dicts are never cached
+    concat([src, '/vsimem/a.tif'], tmp_path / 'a.txt')
+    concat([src], tmp_path / 'b.txt', opts={'mask': ('/vsimem/m.tif',)})
+    concat([src], tmp_path / 'c.txt', opts={'mask': ('/vsimem/m.tif',)})
+    assert len(calls) == 3
+    assert not cache_dir.exists() or entries(cache_dir) == []
@@ -0,0 +1,103 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the publish engine in vogeler.stdlib.
+
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from vogeler.stdlib import publish
+from vogeler.stdlib import file_checksum
+from vogeler.stdlib import copy_file_chunked
+
+
+MAPPING = {'a.tif': 'out/A.tif', 'b.tif': 'out/sub/B.tif'}
+
+
+@pytest.fixture
+def src_dir(tmp_path):
+    src_dir = tmp_path / 'src'
+    src_dir.mkdir()
+    for i, name in enumerate(MAPPING):
+        (src_dir / name).write_bytes(os.urandom(1000 + i))
+    return src_dir
+
+
+def test_publish_move(src_dir, tmp_path):
+    dst_dir = tmp_path / 'dst'
+    records = publish(src_dir, dst_dir, MAPPING, checksum=True)
+
+    assert [r['status'] for r in records] == ['done', 'done']
+    assert [r['method'] for r in records] == ['rename', 'rename']
+    for r in records:
+        with ThreadPoolExecutor() as executor:
+            assert r['checksum'] == file_checksum(r['dst'], executor)
+    assert not any(src_dir.iterdir())
+
+    manifest = json.loads((dst_dir / 'publish_manifest.json').read_text())
+    assert manifest['files'] == records
+
+
+def test_publish_failure_writes_manifest(src_dir, tmp_path):
+    dst_dir = tmp_path / 'dst'
+
+    # Block one destination with a directory
+    (dst_dir / 'out/A.tif').mkdir(parents=True)
+    with pytest.raises(OSError, match="Failed to publish 1 file"):
+        publish(src_dir, dst_dir, MAPPING)
+
+    manifest = json.loads((dst_dir / 'publish_manifest.json').read_text())
+    a, b = manifest['files']
+    assert a['status'] == 'failed'
+    assert 'IsADirectoryError' in a['error']
+    assert b['status'] == 'done'
+    assert (src_dir / 'a.tif').exists()
+    assert (dst_dir / 'out/sub/B.tif').exists()
+
+
+@pytest.mark.parametrize('checksum, verify', [
+    (False, False), (True, False), (False, True),
+])
+def test_copy_file_chunked(tmp_path, checksum, verify):
+    src = tmp_path / 'src.bin'
+    dst = tmp_path / 'dst.bin'
+    src.write_bytes(os.urandom(10_000))
+
+    with ThreadPoolExecutor(4) as executor:
+        result = copy_file_chunked(
+            src, dst, executor, chunk_size=4096,
+            checksum=checksum, verify=verify,
+        )
+        expected = file_checksum(src, executor, chunk_size=4096)
+
+    assert dst.read_bytes() == src.read_bytes()
+    assert result == (expected if checksum or verify else None)
+    assert not (tmp_path / '.dst.bin.part').exists()
+
+
+def test_publish_rerun_keeps_manifest(src_dir, tmp_path):
+    dst_dir = tmp_path / 'dst'
+    manifest_path = dst_dir / 'publish_manifest.json'
+    first = publish(src_dir, dst_dir, MAPPING, checksum=True)
+
+    # Sources are gone after the move, but the earlier records stay
+    (src_dir / 'c.tif').write_bytes(b'c')
+    mapping = {**MAPPING, 'c.tif': 'out/C.tif'}
+    records = publish(src_dir, dst_dir, mapping, checksum=True)
+    assert records[:2] == first
+    assert records[2]['status'] == 'done'
+    assert json.loads(manifest_path.read_text())['files'] == records
+
+    # Files published by an earlier run outside this mapping are kept
+    publish(src_dir, dst_dir, {'d.tif': 'out/D.tif'})
+    files = json.loads(manifest_path.read_text())['files']
+    assert [r['status'] for r in files] == ['missing'] + ['done'] * 3
+
+    # Deleted deliveries are reported missing again
+    (dst_dir / 'out/A.tif').unlink()
+    records = publish(src_dir, dst_dir, MAPPING)
+    assert [r['status'] for r in records] == ['missing', 'done']
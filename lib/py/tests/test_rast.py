@@ -0,0 +1,273 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the raster functions in vogeler.extlib.
+
+
+import numpy as np
+import pytest
+from rasterio.windows import Window
+
+from conftest import write_tif
+
+
+def test_rast_footprints(extlib, tmp_path):
+    paths = [
+        write_tif(tmp_path / 'a.tif', np.zeros((10, 10), 'uint8')),
+        write_tif(
+            tmp_path / 'b.tif', np.zeros((10, 10), 'uint8'),
+            origin=(500010, 4400000),
+        ),
+    ]
+    gdf = extlib.rast_footprints(paths)
+    assert gdf.crs == 'EPSG:26913'
+    assert gdf.geometry.iloc[1].bounds == (500010, 4399990, 500020, 4400000)
+
+    # Rasters in another CRS are rejected
+    paths.append(write_tif(
+        tmp_path / 'c.tif', np.zeros((10, 10), 'uint8'), crs='EPSG:26914',
+    ))
+    with pytest.raises(ValueError, match="CRS differs"):
+        extlib.rast_footprints(paths)
+
+
+def test_clip_rast_windowed_outputs(extlib, tmp_path):
+    import rasterio as rio
+    import shapely
+    from geopandas import GeoDataFrame
+
+    pixels = np.arange(1, 101, dtype='uint8').reshape(10, 10)
+    src = write_tif(tmp_path / 'src.tif', pixels, nodata=0)
+    plots = GeoDataFrame(geometry=[
+        shapely.box(500001, 4399997, 500003, 4399999),
+        shapely.box(500006, 4399991, 500009, 4399995),
+    ], crs='EPSG:26913')
+
+    # Each polygon gets its own output, cropped to its window
+    outs = [tmp_path / 'a.tif', tmp_path / 'b.tif']
+    extlib.clip_rast_windowed(src, plots, outs)
+    with rio.open(outs[0]) as f:
+        assert f.bounds == (500001, 4399997, 500003, 4399999)
+        assert f.read(1).tolist() == pixels[1:3, 1:3].tolist()
+        assert (f.read(2) == 255).all()
+    with rio.open(outs[1]) as f:
+        assert f.bounds == (500006, 4399991, 500009, 4399995)
+        assert f.read(1).tolist() == pixels[5:9, 6:9].tolist()
+
+    # Without a list, polygons form one cutline over their joint window
+    one = tmp_path / 'one.tif'
+    extlib.clip_rast_windowed(src, plots, one)
+    with rio.open(one) as f:
+        assert f.bounds == (500001, 4399991, 500009, 4399999)
+        alpha = f.read(2)
+        assert alpha.sum() == 255 * (4 + 12)
+        assert (f.read(1)[alpha == 0] == 0).all()
+
+
+@pytest.mark.parametrize('block_cache', [False, True])
+def test_clip_rast_windowed_in_memory(extlib, tmp_path, block_cache):
+    import rasterio as rio
+    import shapely
+    from rasterio.io import MemoryFile
+    from rasterio.shutil import delete
+    from geopandas import GeoDataFrame
+
+    pixels = np.arange(100, dtype='float32').reshape(10, 10)
+    pixels[2, 2] = np.nan
+    disk_src = write_tif(tmp_path / 'src.tif', pixels, nodata=np.nan)
+    plots = GeoDataFrame(
+        geometry=[shapely.box(500001, 4399996, 500004, 4399999)],
+        crs='EPSG:26913',
+    )
+
+    # In-memory input and output match the on-disk result
+    disk_out = tmp_path / 'out.tif'
+    extlib.clip_rast_windowed(disk_src, plots, disk_out, block_cache)
+    with MemoryFile(disk_src.read_bytes()) as mem_src:
+        mem_out = '/vsimem/test_clip_out.tif'
+        extlib.clip_rast_windowed(mem_src, plots, [mem_out], block_cache)
+        with rio.open(disk_out) as f, rio.open(mem_out) as g:
+            assert f.transform == g.transform
+            expected, got = f.read(), g.read()
+        delete(mem_out)
+    assert np.array_equal(expected, got, equal_nan=True)
+
+    # Nodata pixels inside the polygon are masked out
+    assert got[1, 1, 1] == 0
+    assert got[1].sum() == 255 * 8
+
+
+@pytest.fixture
+def block_cache(extlib, tmp_path):
+    """Start with an empty block cache, shared through a temp directory."""
+
+    extlib.block_cache_clear()
+    extlib.block_cache_stats(reset=True)
+    extlib.block_cache_config(shared_dir=tmp_path / 'shared')
+    yield tmp_path / 'shared'
+    extlib.block_cache_config(shared_dir=False)
+    extlib.block_cache_clear()
+
+
+def read_cached(extlib, path):
+    import rasterio as rio
+
+    with rio.open(path) as f:
+        return extlib.read_window_cached(f, Window(0, 0, f.width, f.height))
+
+
+def test_block_cache_hits(extlib, tmp_path, block_cache):
+    pixels = np.arange(64 * 64, dtype='uint16').reshape(64, 64)
+    path = write_tif(
+        tmp_path / 'a.tif', pixels, tiled=True, blockxsize=32, blockysize=32,
+    )
+
+    # Blocks are decoded once, then served from this process's cache
+    assert (read_cached(extlib, path)[0] == pixels).all()
+    assert (read_cached(extlib, path)[0] == pixels).all()
+    stats = extlib.block_cache_stats()
+    assert (stats['misses'], stats['hits']) == (4, 4)
+
+    # ... or from the shared directory, without leftover temp files
+    extlib.block_cache_clear()
+    assert (read_cached(extlib, path)[0] == pixels).all()
+    assert extlib.block_cache_stats()['shared_hits'] == 4
+    assert sorted(p.suffix for p in block_cache.iterdir()) == ['.npy'] * 4
+
+
+def test_block_cache_invalidation(extlib, tmp_path, block_cache):
+    import os
+
+    src = write_tif(tmp_path / 'src.tif', np.zeros((8, 8), 'uint8'))
+    vrt_path = tmp_path / 'mosaic.vrt'
+    extlib.write_vrt([src], vrt_path)
+    assert read_cached(extlib, vrt_path).max() == 0
+
+    # Rewritten VRT source is read again, though the VRT did not change
+    vrt_mtime = vrt_path.stat().st_mtime_ns
+    write_tif(src, np.ones((8, 8), 'uint8'))
+    os.utime(src, ns=(vrt_mtime + 10**9, vrt_mtime + 10**9))
+    assert vrt_path.stat().st_mtime_ns == vrt_mtime
+    assert read_cached(extlib, vrt_path).min() == 1
+
+    # Rewritten raster is read again
+    write_tif(src, np.full((8, 8), 2, 'uint8'))
+    os.utime(src, ns=(vrt_mtime + 2 * 10**9, vrt_mtime + 2 * 10**9))
+    assert read_cached(extlib, src).min() == 2
+
+
+def test_block_cache_skips_in_memory(extlib, tmp_path, block_cache):
+    from rasterio.io import MemoryFile
+
+    disk = write_tif(tmp_path / 'a.tif', np.zeros((8, 8), 'uint8'))
+    with MemoryFile(disk.read_bytes()) as mem:
+        with mem.open() as f:
+            window = Window(0, 0, 8, 8)
+            assert extlib.read_window_cached(f, window).max() == 0
+
+        # Replacing an in-memory raster can not serve stale blocks
+        write_tif(disk, np.ones((8, 8), 'uint8'))
+        with MemoryFile(disk.read_bytes(), filename=mem.name) as mem2:
+            with mem2.open() as f:
+                assert extlib.read_window_cached(f, window).min() == 1
+    assert extlib.block_cache_stats()['blocks'] == 0
+
+
+def test_process_windows(extlib, tmp_path):
+    import rasterio as rio
+    from rasterio.io import MemoryFile
+
+    pixels = np.arange(2 * 64 * 48, dtype='uint16').reshape(2, 64, 48)
+    src = write_tif(
+        tmp_path / 'src.tif', pixels, tiled=True, blockxsize=16,
+        blockysize=16,
+    )
+    vrt_path = tmp_path / 'src.vrt'
+    extlib.write_vrt([src], vrt_path)
+
+    # Output matches the function applied to the whole raster, from a
+    # TIFF or VRT source, to a file or in memory
+    for src_path, n_windows in ((src, 12), (vrt_path, None)):
+        out = tmp_path / 'out.tif'
+        timings = extlib.process_windows(
+            src_path, out, lambda a: a * 2, prefetch=1, write_queue=1,
+            driver='GTiff',
+        )
+        if n_windows:
+            assert timings['windows'] == n_windows
+        with rio.open(out) as f:
+            assert (f.read() == pixels * 2).all()
+    with MemoryFile() as mem:
+        extlib.process_windows(src, mem, lambda a: a + 1, driver='GTiff')
+        with mem.open() as f:
+            assert (f.read() == pixels + 1).all()
+
+
+def test_process_windows_errors(extlib, tmp_path):
+    pixels = np.zeros((256, 256), 'uint8')
+    src = write_tif(
+        tmp_path / 'src.tif', pixels, tiled=True, blockxsize=16,
+        blockysize=16,
+    )
+
+    # Errors in the compute stage stop the pipeline and are raised
+    def fail_late(arr, seen=[]):
+        seen.append(1)
+        if len(seen) == 5:
+            raise ZeroDivisionError("compute")
+        return arr
+
+    with pytest.raises(ZeroDivisionError, match="compute"):
+        extlib.process_windows(src, tmp_path / 'a.tif', fail_late)
+
+    # ... as do errors in the writer thread
+    with pytest.raises(ValueError):
+        extlib.process_windows(
+            src,
+            tmp_path / 'b.tif',
+            lambda a: np.zeros((3, *a.shape[1:]), a.dtype),
+            write_queue=1,
+        )
+
+
+def test_update_crs_batch(extlib, tmp_path):
+    import xml.etree.ElementTree as ET
+
+    import rasterio as rio
+    from rasterio.crs import CRS
+
+    pixels = np.arange(16, dtype='uint8').reshape(4, 4)
+    tif = write_tif(tmp_path / 'a.tif', pixels, crs='EPSG:26914')
+    done = write_tif(tmp_path / 'b.tif', pixels, crs='EPSG:26913')
+    vrt = tmp_path / 'a.vrt'
+    extlib.write_vrt([tif], vrt)
+    bad = tmp_path / 'bad.tif'
+    bad.write_text('not a raster')
+
+    # One report per file, in input order; failures do not stop the batch
+    reports = extlib.update_crs_batch([tif, done, vrt, bad], 26913)
+    assert [r['path'] for r in reports] == [
+        str(p) for p in (tif, done, vrt, bad)
+    ]
+    assert [r['status'] for r in reports] == [
+        'updated', 'unchanged', 'updated', 'failed',
+    ]
+    assert reports[0]['old_crs'] == 'EPSG:26914'
+    assert reports[3]['error']
+
+    # Only headers change
+    for path in (tif, vrt):
+        with rio.open(path) as f:
+            assert f.crs == CRS.from_epsg(26913)
+            assert (f.read(1) == pixels).all()
+
+    # Forced updates rewrite the header anyway; lat/lon VRTs get GDAL's
+    # axis mapping
+    reports = extlib.update_crs_batch([done, vrt], 'EPSG:4326', force=True)
+    assert [r['status'] for r in reports] == ['updated', 'updated']
+    srs = ET.parse(vrt).getroot().find('SRS')
+    assert srs.get('dataAxisToSRSAxisMapping') == '2,1'
+    assert extlib.update_crs_batch([done], 4326)[0]['status'] == 'unchanged'
+    assert extlib.update_crs_batch(
+        [done], 4326, force=True,
+    )[0]['status'] == 'updated'
@@ -0,0 +1,276 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the command pipeline functions in vogeler.sp.
+
+
+import os
+import sys
+import time
+import asyncio
+import subprocess as sp
+from pathlib import Path
+
+import pytest
+
+from vogeler.sp import cmd_pipe
+from vogeler.sp import cmd_pipe_async
+
+
+def run_pipe(cmds):
+    lines = []
+    asyncio.run(cmd_pipe_async(cmds, on_stdout=lines.append))
+    return lines
+
+
+def test_cmd_pipe_lines():
+    lines = run_pipe([['printf', 'b\\na\\nc'], ['sort']])
+    assert lines == ['a\n', 'b\n', 'c\n']
+
+    # Last line without newline is still passed on
+    assert run_pipe([['printf', 'a\\nb']]) == ['a\n', 'b']
+
+
+def test_cmd_pipe_long_line():
+    code = "import sys; sys.stdout.write('x' * 200_000 + '\\nend')"
+    lines = run_pipe([[sys.executable, '-c', code], ['cat']])
+    assert lines == ['x' * 200_000 + '\n', 'end']
+
+
+def test_cmd_pipe_sigpipe_upstream():
+    # "yes" is killed by SIGPIPE once "head" exits successfully
+    assert run_pipe([['yes'], ['head', '-n', '2']]) == ['y\n', 'y\n']
+    cmd_pipe([['yes'], ['head', '-n', '2']])
+
+
+def test_cmd_pipe_failure():
+    with pytest.raises(sp.CalledProcessError) as e:
+        run_pipe([['yes'], ['sh', '-c', 'head -n 1 >/dev/null; exit 3']])
+    assert e.value.returncode == 3
+
+    with pytest.raises(sp.CalledProcessError) as e:
+        run_pipe([['sh', '-c', 'echo oops >&2; exit 2'], ['cat']])
+    assert e.value.returncode == 2
+    assert 'oops' in e.value.stderr
+
+
+def test_cmd_pipe_launch_failure():
+    # A stage that cannot start stops the stages already running and leaks
+    # no pipe ends
+    fds = len(os.listdir('/proc/self/fd'))
+    start = time.monotonic()
+    with pytest.raises(FileNotFoundError):
+        run_pipe([['sleep', '30'], ['cat'], ['/nonexistent/cmd']])
+    assert time.monotonic() - start < 10
+    assert len(os.listdir('/proc/self/fd')) == fds
+
+
+def write_mosaic(tmp_path, width):
+    """Write a one-band GeoTIFF of given width and a VRT mosaic of it."""
+
+    import numpy as np
+    import rasterio as rio
+    from rasterio.transform import from_origin
+
+    tif_path = tmp_path / 'tile.tif'
+    with rio.open(
+        tif_path, 'w', driver='GTiff', width=width, height=512, count=1,
+        dtype='uint8', transform=from_origin(500000, 4400000, 1, 1),
+    ) as f:
+        f.write(np.ones((1, 512, width), dtype='uint8'))
+    vrt_path = tmp_path / 'mosaic.vrt'
+    vrt_path.write_text(
+        f'<VRTDataset rasterXSize="{width}" rasterYSize="512">'
+        '<GeoTransform>500000, 1, 0, 4400000, 0, -1</GeoTransform>'
+        '<VRTRasterBand dataType="Byte" band="1"><SimpleSource>'
+        '<SourceFilename relativeToVRT="1">tile.tif</SourceFilename>'
+        '<SourceBand>1</SourceBand></SimpleSource></VRTRasterBand>'
+        '</VRTDataset>'
+    )
+    return vrt_path
+
+
+def test_gdaladdo_incremental(tmp_path, monkeypatch):
+    import vogeler.sp
+
+    vrt_path = write_mosaic(tmp_path, 512)
+    ovr_path = Path(f"{vrt_path}.ovr")
+
+    # Stand in for gdaladdo, noting if overviews existed and creating them
+    calls = []
+
+    def fake_run_cmd(cmd, **kwargs):
+        calls.append((cmd, ovr_path.exists()))
+        ovr_path.touch()
+
+    monkeypatch.setattr(vogeler.sp, 'run_cmd', fake_run_cmd)
+
+    # First run builds all levels and records the grid
+    vogeler.sp.gdaladdo(vrt_path, levels=[2, 4], incremental=True)
+    assert calls[-1][0][-3:] == [str(vrt_path), '2', '4']
+    assert Path(f"{vrt_path}.ovr.json").exists()
+
+    # Unchanged grid only refreshes changed blocks
+    vogeler.sp.gdaladdo(vrt_path, levels=[2, 4], incremental=True)
+    assert '--partial-refresh-from-source-timestamp' in calls[-1][0]
+
+    # Grown mosaic gets its stale overviews deleted and rebuilt
+    write_mosaic(tmp_path, 1024)
+    vogeler.sp.gdaladdo(vrt_path, levels=[2, 4], incremental=True)
+    cmd, had_ovr = calls[-1]
+    assert cmd[-3:] == [str(vrt_path), '2', '4']
+    assert not had_ovr
+
+    # Refreshed source is picked up in place
+    tif_path = tmp_path / 'tile.tif'
+    ovr_mtime = ovr_path.stat().st_mtime
+    os.utime(tif_path, (ovr_mtime + 10, ovr_mtime + 10))
+    vogeler.sp.gdaladdo(vrt_path, levels=[2, 4], incremental=True)
+    assert '--partial-refresh-from-source-timestamp' in calls[-1][0]
+
+    # Source going back in time (e.g. restored from backup) forces a rebuild
+    os.utime(tif_path, (ovr_mtime - 10, ovr_mtime - 10))
+    vogeler.sp.gdaladdo(vrt_path, levels=[2, 4], incremental=True)
+    cmd, had_ovr = calls[-1]
+    assert cmd[-3:] == [str(vrt_path), '2', '4']
+    assert not had_ovr
+
+    # So does a source replaced by an older file in the same grid
+    tif_path.rename(tmp_path / 'other.tif')
+    vrt_path.write_text(vrt_path.read_text().replace('tile.tif', 'other.tif'))
+    vogeler.sp.gdaladdo(vrt_path, levels=[2, 4], incremental=True)
+    cmd, had_ovr = calls[-1]
+    assert cmd[-3:] == [str(vrt_path), '2', '4']
+    assert not had_ovr
+
+
+def test_batch_env_and_errors():
+    from rasterio.env import getenv
+
+    from vogeler.sp import batch
+    from vogeler.sp import run_cmd
+
+    def job(name):
+        if name == 'bad':
+            run_cmd(['sh', '-c', 'echo broken >&2; exit 1'])
+        p = run_cmd(
+            ['sh', '-c', 'echo $GDAL_NUM_THREADS'], stdout=sp.PIPE, text=True,
+        )
+        return p.stdout.strip(), getenv()['GDAL_NUM_THREADS']
+
+    reports = dict(batch(job, ['a', 'b', 'bad'], max_workers=2, threads=3))
+
+    # Subprocesses and in-process GDAL calls both see the job's threads
+    assert reports['a']['result'] == ('3', '3')
+    assert reports['a']['error'] is None
+
+    # Failures are reported with their stderr instead of raised
+    assert isinstance(reports['bad']['error'], sp.CalledProcessError)
+    assert 'broken' in reports['bad']['stderr']
+
+
+def test_vrt2cog_strips(tmp_path, monkeypatch):
+    import vogeler.sp
+
+    vrt_path = write_mosaic(tmp_path, 512)
+    cog_path = tmp_path / 'out.tif'
+
+    # Stand in for the GDAL tools, recording what they are asked to do
+    calls = []
+
+    def fake_translate(
+        src_path, dst_path, creation_opts, out_format='GTiff', srcwin=None,
+    ):
+        calls.append((
+            Path(src_path).name, out_format, creation_opts['COMPRESS'], srcwin,
+        ))
+
+    monkeypatch.setattr(vogeler.sp, 'gdal_translate', fake_translate)
+    monkeypatch.setattr(vogeler.sp, 'gdal_build_vrt', lambda *a: None)
+
+    # Strips are translated uncompressed and encoded once into the COG
+    vogeler.sp.vrt2cog(
+        vrt_path, cog_path, block_size=256, strip_rows=256, max_workers=2,
+    )
+    *strips, cog = calls
+    assert [s[3] for s in strips] == [(0, 0, 512, 256), (0, 256, 512, 256)]
+    assert all(s[2] == 'NONE' for s in strips)
+    assert cog == ('strips.vrt', 'COG', 'ZSTD', None)
+
+    # A single worker skips the strips
+    calls.clear()
+    vogeler.sp.vrt2cog(vrt_path, cog_path, max_workers=1)
+    assert calls == [('mosaic.vrt', 'COG', 'ZSTD', None)]
+
+
+VRT_EXPECTED = """
+<VRTDataset rasterXSize="6" rasterYSize="2">
+  <GeoTransform>500000, 1, 0, 4400002, 0, -1</GeoTransform>
+  <VRTRasterBand dataType="Byte" band="1">
+    <NoDataValue>0</NoDataValue>
+    <ColorInterp>Gray</ColorInterp>
+    <ComplexSource>
+      <SourceFilename relativeToVRT="1">a.tif</SourceFilename>
+      <SourceBand>1</SourceBand>
+      <SourceProperties RasterXSize="4" RasterYSize="2" DataType="Byte"
+        BlockXSize="4" BlockYSize="2" />
+      <SrcRect xOff="0" yOff="0" xSize="4" ySize="2" />
+      <DstRect xOff="0" yOff="0" xSize="4" ySize="2" />
+      <NODATA>0</NODATA>
+    </ComplexSource>
+    <ComplexSource>
+      <SourceFilename relativeToVRT="1">b.tif</SourceFilename>
+      <SourceBand>1</SourceBand>
+      <SourceProperties RasterXSize="2" RasterYSize="2" DataType="Byte"
+        BlockXSize="2" BlockYSize="2" />
+      <SrcRect xOff="0" yOff="0" xSize="2" ySize="2" />
+      <DstRect xOff="4" yOff="0" xSize="2" ySize="2" />
+      <NODATA>255</NODATA>
+    </ComplexSource>
+  </VRTRasterBand>
+</VRTDataset>
+"""
+
+
+def test_write_vrt(tmp_path):
+    import xml.etree.ElementTree as ET
+
+    import numpy as np
+    import rasterio as rio
+    from rasterio.crs import CRS
+
+    from conftest import write_tif
+    from vogeler.sp import write_vrt
+
+    # Adjacent tiles with their own nodata values, plus incompatible ones
+    a = write_tif(
+        tmp_path / 'a.tif', np.array([[0, 1, 2, 3]] * 2, 'uint8'),
+        origin=(500000, 4400002), nodata=0,
+    )
+    b = write_tif(
+        tmp_path / 'b.tif', np.array([[255, 5]] * 2, 'uint8'),
+        origin=(500004, 4400002), nodata=255,
+    )
+    other_crs = write_tif(
+        tmp_path / 'c.tif', np.ones((2, 2), 'uint8'),
+        origin=(500006, 4400002), crs='EPSG:26914',
+    )
+    other_dtype = write_tif(
+        tmp_path / 'd.tif', np.ones((2, 2), 'float32'),
+        origin=(500006, 4400002),
+    )
+    vrt_path = tmp_path / 'mosaic.vrt'
+    write_vrt([a, b, other_crs, other_dtype], vrt_path)
+
+    # XML matches the hand-checked VRT, apart from the CRS
+    root = ET.parse(vrt_path).getroot()
+    srs = root.find('SRS')
+    root.remove(srs)
+    assert CRS.from_wkt(srs.text) == CRS.from_epsg(26913)
+    assert ET.canonicalize(
+        ET.tostring(root, encoding='unicode'), strip_text=True,
+    ) == ET.canonicalize(VRT_EXPECTED, strip_text=True)
+
+    # Each source is masked with its own nodata value
+    with rio.open(vrt_path) as f:
+        assert f.read(1).tolist() == [[0, 1, 2, 3, 0, 5]] * 2
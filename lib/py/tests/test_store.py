@@ -0,0 +1,77 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the chunked raster store in vogeler.extlib.
+
+
+import numpy as np
+import pytest
+from rasterio.windows import Window
+
+from conftest import write_tif
+
+
+def test_store_round_trip(extlib, tmp_path):
+    import rasterio as rio
+
+    pixels = np.arange(2 * 10 * 7, dtype='int16').reshape(2, 10, 7)
+    src = write_tif(tmp_path / 'src.tif', pixels, nodata=-1)
+
+    # Chunks are split unevenly along the right and bottom edges
+    store = extlib.tif2store(src, tmp_path / 'store', chunk_size=4)
+    assert sorted(p.name for p in store['path'].glob('*.npy')) == [
+        f"c{r}_{c}.npy" for r in range(3) for c in range(2)
+    ]
+    assert (extlib.store_read(store) == pixels).all()
+
+    # Windows within one chunk are read-only views, others are copies
+    view = extlib.store_read(store, Window(4, 4, 3, 4))
+    assert not view.flags.writeable
+    assert (view == pixels[:, 4:8, 4:7]).all()
+    assert (
+        extlib.store_read(store, Window(2, 3, 4, 6), indexes=[2])
+        == pixels[1:, 3:9, 2:6]
+    ).all()
+
+    # Writes across chunks land in the exported raster
+    extlib.store_write(
+        store, np.full((2, 3, 3), 99, 'int16'), Window(3, 3, 3, 3),
+    )
+    extlib.store_flush(store)
+    out = tmp_path / 'out.tif'
+    extlib.store2tif(store['path'], out)
+    expected = pixels.copy()
+    expected[:, 3:6, 3:6] = 99
+    with rio.open(out) as f, rio.open(src) as g:
+        assert (f.read() == expected).all()
+        assert (f.transform, f.crs, f.nodata) == (g.transform, g.crs, -1)
+
+
+def test_store_missing_chunks_and_bounds(extlib, tmp_path):
+    store = extlib.store_create(
+        tmp_path / 'store', 6, 5, 1, 'float32', (1, 0, 0, 0, -1, 5),
+        crs='EPSG:26913', nodata=np.nan, chunk_size=4,
+    )
+
+    # Unwritten chunks read as nodata and are not created
+    extlib.store_write(
+        store, np.ones((1, 2, 2), 'float32'), Window(0, 0, 2, 2),
+    )
+    arr = extlib.store_read(store)
+    assert np.isnan(arr).sum() == 30 - 4
+    assert not (store['path'] / 'c1_1.npy').exists()
+
+    # Store reopens with its georeferencing
+    extlib.store_flush(store)
+    reopened = extlib.store_open(store['path'])
+    assert reopened['transform'] == store['transform']
+    assert np.array_equal(
+        extlib.store_read(reopened), arr, equal_nan=True,
+    )
+
+    with pytest.raises(ValueError, match="outside of store"):
+        extlib.store_read(store, Window(4, 0, 3, 1))
+    with pytest.raises(ValueError, match="outside of store"):
+        extlib.store_write(store, np.ones((1, 1, 1)), Window(6, 0, 1, 1))
+    with pytest.raises(ValueError, match="Band count"):
+        extlib.store_write(store, np.ones((2, 1, 1)), Window(0, 0, 1, 1))
@@ -0,0 +1,179 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for the virtual point cloud (VPC) functions in
+# vogeler.extlib.
+
+
+import os
+import json
+import shutil
+import struct
+import subprocess as sp
+
+import pytest
+from pyproj import CRS
+
+from conftest import write_las
+
+
+TILES = {
+    'tile_a': [(500000, 4400000, 1), (500099, 4400099, 20)],
+    'tile_b': [
+        (500100, 4400000, 2), (500199, 4400099, 30), (500150, 4400050, 5),
+    ],
+    'tile_c': [(500200, 4400000, 3), (500299, 4400099, 40)],
+}
+
+
+@pytest.fixture
+def tiles(tmp_path):
+    """Write the test tiles and return their paths by name."""
+
+    las_dir = tmp_path / 'las'
+    las_dir.mkdir()
+    return {
+        name: write_las(las_dir / f"{name}.las", points)
+        for name, points in TILES.items()
+    }
+
+
+def load_features(vpc_path):
+    with open(vpc_path) as f:
+        return {feat['id']: feat for feat in json.load(f)['features']}
+
+
+@pytest.mark.skipif(
+    shutil.which('pdal_wrench') is None, reason="pdal_wrench not installed",
+)
+def test_write_vpc_matches_pdal_wrench(extlib, tiles, tmp_path):
+    ours_path = tmp_path / 'ours.vpc'
+    theirs_path = tmp_path / 'theirs.vpc'
+    extlib.write_vpc(list(tiles.values()), ours_path)
+    sp.run(
+        [
+            'pdal_wrench', 'build_vpc', f"--output={theirs_path}",
+            *map(str, tiles.values()),
+        ],
+        check=True,
+    )
+
+    ours, theirs = load_features(ours_path), load_features(theirs_path)
+    assert ours.keys() == theirs.keys()
+    for item_id, theirs_item in theirs.items():
+        ours_item = ours[item_id]
+        ours_props = ours_item['properties']
+        theirs_props = theirs_item['properties']
+
+        assert ours_props['pc:count'] == theirs_props['pc:count']
+        assert ours_props['proj:bbox'] == pytest.approx(
+            theirs_props['proj:bbox'],
+        )
+        assert ours_item['bbox'] == pytest.approx(theirs_item['bbox'])
+        assert (
+            CRS.from_wkt(ours_props['proj:wkt2'])
+            == CRS.from_wkt(theirs_props['proj:wkt2'])
+        )
+
+        # Asset paths resolve to the same file
+        ours_href = ours_item['assets']['data']['href']
+        theirs_href = theirs_item['assets']['data']['href']
+        assert (
+            (tmp_path / ours_href).resolve()
+            == (tmp_path / theirs_href).resolve()
+        )
+
+
+def test_write_vpc_items(extlib, tiles, tmp_path):
+    vpc_path = tmp_path / 'tiles.vpc'
+    extlib.write_vpc(list(tiles.values()), vpc_path)
+
+    features = load_features(vpc_path)
+    assert list(features) == list(TILES)
+    for name, points in TILES.items():
+        props = features[name]['properties']
+        xs, ys, zs = zip(*points)
+        assert props['pc:count'] == len(points)
+        assert props['proj:bbox'] == pytest.approx(
+            [min(xs), min(ys), min(zs), max(xs), max(ys), max(zs)],
+        )
+        assert CRS.from_wkt(props['proj:wkt2']) == CRS.from_epsg(26913)
+        assert features[name]['assets']['data']['href'] == (
+            f"./las/{name}.las"
+        )
+
+
+def test_write_vpc_update(extlib, tiles, tmp_path, monkeypatch):
+    vpc_path = tmp_path / 'tiles.vpc'
+    extlib.write_vpc([tiles['tile_a'], tiles['tile_b']], vpc_path)
+
+    # Make the VPC newer than tile_a but older than a modified tile_b
+    vpc_mtime = vpc_path.stat().st_mtime
+    os.utime(tiles['tile_a'], (vpc_mtime - 10, vpc_mtime - 10))
+    write_las(tiles['tile_b'], [(500100, 4400000, 2)])
+    os.utime(tiles['tile_b'], (vpc_mtime + 10, vpc_mtime + 10))
+
+    # Only new and modified files are read
+    read = []
+    las_vpc_item = extlib.las_vpc_item
+
+    def record_read(las_path, vpc_dir):
+        read.append(las_path.name)
+        return las_vpc_item(las_path, vpc_dir)
+
+    monkeypatch.setattr(extlib, 'las_vpc_item', record_read)
+    extlib.write_vpc(
+        [tiles['tile_b'], tiles['tile_c']], vpc_path, update=True,
+    )
+    assert sorted(read) == ['tile_b.las', 'tile_c.las']
+
+    # Removed files are dropped and modified files are refreshed
+    features = load_features(vpc_path)
+    assert list(features) == ['tile_b', 'tile_c']
+    assert features['tile_b']['properties']['pc:count'] == 1
+
+    # Unchanged files are reused
+    read.clear()
+    os.utime(vpc_path, (vpc_mtime + 20, vpc_mtime + 20))
+    extlib.write_vpc(
+        [tiles['tile_a'], tiles['tile_b'], tiles['tile_c']],
+        vpc_path,
+        update=True,
+    )
+    assert read == ['tile_a.las']
+    assert list(load_features(vpc_path)) == ['tile_a', 'tile_b', 'tile_c']
+
+
+def test_vpc_footprints(extlib, tiles, tmp_path):
+    vpc_path = tmp_path / 'tiles.vpc'
+    extlib.write_vpc(list(tiles.values()), vpc_path)
+
+    gdf = extlib.vpc_footprints(vpc_path)
+    assert gdf.crs == CRS.from_epsg(26913)
+    assert list(gdf['path']) == [p.resolve() for p in tiles.values()]
+    assert gdf.geometry.iloc[0].bounds == pytest.approx(
+        (500000, 4400000, 500099, 4400099),
+    )
+
+
+def test_vpc_footprints_mixed_crs(extlib, tiles, tmp_path):
+    write_las(tiles['tile_c'], TILES['tile_c'], epsg=26914)
+    vpc_path = tmp_path / 'tiles.vpc'
+    extlib.write_vpc(list(tiles.values()), vpc_path)
+
+    with pytest.raises(ValueError, match="mixed CRS"):
+        extlib.vpc_footprints(vpc_path)
+
+
+def test_las_vpc_item_dates(extlib, tiles, tmp_path):
+    item = extlib.las_vpc_item(tiles['tile_a'], tmp_path)
+    assert item['properties']['datetime'] == '2024-01-01T00:00:00Z'
+
+    # Without a valid creation date, the date is left open
+    with open(tiles['tile_a'], 'r+b') as f:
+        f.seek(90)
+        f.write(struct.pack('<HH', 0, 0))
+    props = extlib.las_vpc_item(tiles['tile_a'], tmp_path)['properties']
+    assert props['datetime'] is None
+    assert props['start_datetime'] == '1970-01-01T00:00:00Z'
+    assert props['start_datetime'] < props['end_datetime']
@@ -0,0 +1,56 @@
+# Author: Daniel Rode
+
+
+# Description: Tests for WKT/WKB parsing in vogeler.extlib.
+
+
+import shapely
+
+
+POINTS = ['POINT (1 2)', 'POINT (3 4)']
+
+
+def test_wkt2gdf_wkt_and_wkb(extlib):
+    wkb = [shapely.from_wkt(p).wkb for p in POINTS]
+    for geoms in (POINTS, wkb, POINTS[0]):
+        gdf = extlib.wkt2gdf(geoms, crs='EPSG:26913')
+        assert gdf.crs == 'EPSG:26913'
+        assert list(gdf.geometry.to_wkt()) == POINTS[:len(gdf)]
+
+
+def test_wkt2gdf_iterator(extlib):
+    gdf = extlib.wkt2gdf(
+        (p for p in POINTS), crs='EPSG:26913', attrs={'id': [1, 2]},
+    )
+    assert list(gdf['id']) == [1, 2]
+    assert list(gdf.geometry.to_wkt()) == POINTS
+
+
+def test_wkt2gdf_empty_and_null(extlib):
+    gdf = extlib.wkt2gdf([], crs='EPSG:26913')
+    assert len(gdf) == 0
+    assert gdf.crs == 'EPSG:26913'
+
+    gdf = extlib.wkt2gdf([None, None], crs='EPSG:26913')
+    assert len(gdf) == 2
+    assert gdf.geometry.isna().all()
+
+    gdf = extlib.wkt2gdf([None, POINTS[0]], crs='EPSG:26913')
+    assert gdf.geometry.iloc[1].wkt == POINTS[0]
+
+
+def test_wkt2gdf_pandas_nulls(extlib):
+    import numpy as np
+    import pandas as pd
+
+    gdf = extlib.wkt2gdf(
+        pd.Series([POINTS[0], np.nan, None, pd.NA]), crs='EPSG:26913',
+    )
+    assert gdf.geometry.iloc[0].wkt == POINTS[0]
+    assert gdf.geometry.iloc[1:].isna().all()
+
+
+def test_wkt2gdf_parallel(extlib):
+    wkt = [f"POINT ({i} {i})" for i in range(1000)]
+    gdf = extlib.wkt2gdf(wkt, crs='EPSG:26913', chunk_size=300, max_workers=2)
+    assert list(gdf.geometry.to_wkt()) == wkt
@@ -16,6 +16,9 @@
 from pathlib import Path
 from logging import ERROR
 
+# Import in-house libraries
+from vogeler.stdlib import memoize_files
+
 # Import external libraries
 import shapely
 
@@ -23,6 +26,7 @@ import shapely
 from rpy2.robjects.packages import importr
 from rpy2.rinterface_lib.callbacks import logger as rpy2_logger
 from rpy2.rinterface import NULL as R_NULL
+from rpy2.robjects.vectors import StrVector
 grDevices = importr("grDevices")
 lidr = importr("lidR")
 rpy2_logger.setLevel(ERROR)  # Suppress R warning messages
@@ -35,17 +39,29 @@ grDevices.pdf(R_NULL)  # Prevent creation of Rplots.pdf
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 
+@memoize_files('dst_las_path')
 def clip_las(
-    src_las_path: Path,
+    src_las_path: Path | list[Path],
     bounds: shapely.Polygon,
     dst_las_path: Path,
 ) -> None:
-    """TODO"""
+    """Clip a point cloud catalog to a polygon; save as new point cloud.
+
+    "src_las_path" may be a catalog directory or file, or a list of files
+    (e.g. candidates from extlib.select_files) so that lidR only indexes
+    the tiles that can intersect the polygon.
+    """
 
     # Remove Z dimension from polygon (if it has one)
     bounds = shapely.force_2d(bounds)
 
+    # Build catalog from given path or list of files
+    if isinstance(src_las_path, (list, tuple)):
+        src_las_path = StrVector([str(p) for p in src_las_path])
+    else:
+        src_las_path = str(src_las_path)
+
     # Clip catalog to given polygon and save as new point cloud file
-    ctg = lidr.readLAScatalog(str(src_las_path))
+    ctg = lidr.readLAScatalog(src_las_path)
     las = lidr.clip_roi(ctg, bounds.wkt)
     lidr.writeLAS(las, str(dst_las_path))
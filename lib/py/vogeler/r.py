@@ -13,8 +13,14 @@
 # -----------------------------------------------------------------------------
 
 # Import standard libraries
+from pathlib import Path
 from logging import ERROR
 
+# Import external libraries
+import shapely
+import numpy as np
+from geopandas import GeoDataFrame
+
 # Import R libraries
 from rpy2.robjects import r
 from rpy2.robjects.methods import RS4
@@ -25,6 +31,7 @@ from rpy2.rinterface_lib.callbacks import logger as rpy2_logger
 
 rpy2_logger.setLevel(ERROR)  # Suppress R warning messages
 
+rbase = rlib("base")
 sf = rlib("sf")
 
 
@@ -59,6 +66,60 @@ def get_ctg_geoms_wkt(ctg: RS4) -> list[str]:
     return list(geoms_wkt)
 
 
+def get_ctg_geoms(ctg: RS4) -> np.ndarray:
+    """Convert lidR LAS catalog geometries to a shapely geometry array.
+
+    Geometries are serialized to WKB in R, concatenated into one raw vector
+    and handed to Python in a single buffer copy, then parsed with one
+    vectorized shapely call.
+    """
+
+    # R: ctg@data$geometry
+    ctg_data = ctg.do_slot("data")
+    geoms = ctg_data[ctg_data.names.index('geometry')]
+
+    # Serialize geometries to WKB and flatten into a single raw vector
+    geoms_wkb = sf.st_as_binary(geoms)
+    wkb_lens = np.asarray(rbase.lengths(geoms_wkb), dtype=np.int64)
+    if len(wkb_lens) == 0:
+        return np.empty(0, dtype=object)  # unlist() of nothing is NULL
+    wkb_buf = bytes(rbase.unlist(geoms_wkb).memoryview())
+
+    # Split buffer back into per-geometry WKB strings and parse them
+    wkb_ends = np.cumsum(wkb_lens)
+    wkb_list = np.empty(len(wkb_lens), dtype=object)
+    wkb_list[:] = [
+        wkb_buf[end - n:end] for end, n in zip(wkb_ends, wkb_lens)
+    ]
+
+    return shapely.from_wkb(wkb_list)
+
+
+def get_ctg_gdf(ctg: RS4) -> GeoDataFrame:
+    """Convert a lidR LAS catalog into a GeoDataFrame.
+
+    Returns one row per point cloud file with its "filename" and "epsg",
+    and its tile geometry. All tiles must share one EPSG, which becomes the
+    GeoDataFrame CRS.
+    """
+
+    # R: ctg@data$filename
+    ctg_data = ctg.do_slot("data")
+    filenames = ctg_data[ctg_data.names.index('filename')]
+
+    # Verify all tiles share a CRS
+    epsgs = get_ctg_epsgs(ctg)
+    if len(set(epsgs)) > 1:
+        raise ValueError("Catalog tiles have mixed CRS:", sorted(set(epsgs)))
+    crs = epsgs[0] if epsgs else None
+
+    return GeoDataFrame(
+        {'filename': [Path(p) for p in filenames], 'epsg': epsgs},
+        geometry=get_ctg_geoms(ctg),
+        crs=crs,
+    )
+
+
 def get_las_crs_wkt(las: RS4) -> str:
     """Given a lidR LAS object, return its CRS as a WKT string."""
 
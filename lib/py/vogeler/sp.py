@@ -21,17 +21,74 @@
 # -----------------------------------------------------------------------------
 
 # Import standard libraries
+import os
 import json
+import time
+import fcntl
+import shutil
+import signal
+import hashlib
+import logging
+import asyncio
+import functools
 import subprocess as sp
+import xml.etree.ElementTree as ET
 from pathlib import Path
-from tempfile import NamedTemporaryFile
 from tempfile import TemporaryDirectory
+from tempfile import gettempdir
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+from typing import Any
+from collections.abc import Callable
+from collections.abc import Iterator
+
+# Import in-house libraries
+from vogeler.stdlib import memoize_files
+from vogeler.stdlib import vsimem_path
 
 # Import external libraries
+import numpy as np
 import rasterio as rio
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.shutil import copy as rio_copy
 from geopandas import GeoDataFrame
 
 
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+# Settings of the batch job the current thread is running (see batch)
+BATCH_JOB = ContextVar('BATCH_JOB', default=None)
+
+# Node-local cache of assets extracted from Git repos (see import_scripts)
+GIT_ASSETS_CACHE = Path(gettempdir(), 'vogeler-git-assets')
+
+# GDAL names of raster data types
+GDAL_DTYPES = {
+    'uint8': 'Byte',
+    'int8': 'Int8',
+    'uint16': 'UInt16',
+    'int16': 'Int16',
+    'uint32': 'UInt32',
+    'int32': 'Int32',
+    'uint64': 'UInt64',
+    'int64': 'Int64',
+    'float32': 'Float32',
+    'float64': 'Float64',
+    'complex64': 'CFloat32',
+    'complex128': 'CFloat64',
+}
+
+log = logging.getLogger(__name__)
+
+
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 # Functions
@@ -39,70 +96,755 @@ from geopandas import GeoDataFrame
 # -----------------------------------------------------------------------------
 
 def import_scripts(
-    repo_path: Path, repo_commit: str, repo_assets: list[Path], dst_dir: Path,
+    repo_path: Path,
+    repo_commit: str,
+    repo_assets: list[Path],
+    dst_dir: Path,
+    cache_dir: Path = GIT_ASSETS_CACHE,
+    link='hardlink',
 ) -> None:
-    """Copy dependency scripts to another directory using Git."""
+    """Copy dependency scripts to another directory using Git.
+
+    Assets are extracted once per commit and asset list into a
+    content-addressed directory under "cache_dir" (extraction is atomic and
+    guarded by a file lock, so concurrent jobs wait for one extraction),
+    then materialized into "dst_dir" by "link": 'hardlink' (falling back to
+    symlinks across file systems), 'symlink' or 'copy'. Cached files are
+    made read-only, since hardlinks share them with every job.
+    """
 
     log.info(f"Git repo path: {repo_path}")
     log.info(f"Git repo commit: {repo_commit}")
 
-    dst_dir.mkdir(parents=True, exist_ok=True)
-
-    git_cmd = (
+    # Key cache entry by full commit hash and asset list
+    cmd = (
         'git',
-        '-C', repo_path,
-        'archive',
-        '--format', 'tar',
-        repo_commit,
-        *repo_assets,
-    )
-    tar_cmd = (
-        'tar',
-        '--directory', str(dst_dir),
-        '--file', '-',
-        '--extract',
+        '-C', str(repo_path),
+        'rev-parse',
+        '--verify',
+        f"{repo_commit}^{{commit}}",
     )
-    cmd_pipe([git_cmd, tar_cmd])
+    commit = run_cmd(cmd, text=True, capture_output=True).stdout.strip()
+    key = hashlib.sha256(
+        '\0'.join([commit, *sorted(str(a) for a in repo_assets)]).encode()
+    ).hexdigest()
+    cache_dir = Path(cache_dir)
+    entry = cache_dir / key
 
+    # Extract assets into cache, unless another job already did
+    if not entry.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(cache_dir / f"{key}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not entry.exists():
+                tmp_dir = cache_dir / f".{key}.{os.getpid()}.tmp"
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                tmp_dir.mkdir()
+                git_cmd = (
+                    'git',
+                    '-C', repo_path,
+                    'archive',
+                    '--format', 'tar',
+                    commit,
+                    *repo_assets,
+                )
+                tar_cmd = (
+                    'tar',
+                    '--directory', str(tmp_dir),
+                    '--file', '-',
+                    '--extract',
+                )
+                cmd_pipe([git_cmd, tar_cmd])
+                for root, _, files in os.walk(tmp_dir):
+                    for name in files:
+                        path = os.path.join(root, name)
+                        os.chmod(path, os.stat(path).st_mode & ~0o222)
+                tmp_dir.rename(entry)
+        log.info(f"Extracted Git assets to cache: {entry}")
+
+    # Materialize cached assets in destination directory
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    for root, _, files in os.walk(entry):
+        rel_root = os.path.relpath(root, entry)
+        Path(dst_dir, rel_root).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            src = Path(root, name)
+            dst = Path(dst_dir, rel_root, name)
+            dst.unlink(missing_ok=True)
+            if link == 'copy':
+                shutil.copy2(src, dst)
+                continue
+            if link == 'hardlink':
+                try:
+                    os.link(src, dst)
+                    continue
+                except OSError:
+                    pass  # Different file system; fall back to symlink
+            dst.symlink_to(src.absolute())
 
-def cmd_pipe(cmds, stdin=None) -> None:
-    """Chain system commands.
+
+async def cmd_pipe_async(
+    cmds, stdin=None, on_stdout: Callable = None,
+) -> list[sp.CompletedProcess]:
+    """Chain system commands without blocking.
 
     Run several system commands and pipe the output from one to the stdin
-    of the next.
+    of the next. Stages are connected with OS pipes, so data never passes
+    through Python; the stdout of the last stage is streamed line by line to
+    "on_stdout" (default: print) while the stderr of every stage is drained
+    concurrently, so no stage can stall on a full pipe. If a stage fails,
+    subprocess.CalledProcessError is raised for it, with its stderr.
     """
 
+    if on_stdout is None:
+        on_stdout = functools.partial(print, end='')
+
     # Chain stdin and stdout of given commands together
     proc_list = []
     last_stdout = stdin
-    for c in cmds:
-        p = sp.Popen(c, stdin=last_stdout, stdout=sp.PIPE)
+    for i, c in enumerate(cmds):
+        is_last = i == len(cmds) - 1
+        if is_last:
+            stdout, next_stdin = asyncio.subprocess.PIPE, None
+        else:
+            next_stdin, stdout = os.pipe()
+        try:
+            p = await asyncio.create_subprocess_exec(
+                *[str(a) for a in c],
+                stdin=last_stdout,
+                stdout=stdout,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except BaseException:
+            # Do not leave earlier stages running on a half-built pipeline
+            if not is_last:
+                os.close(next_stdin)
+            for p in proc_list:
+                if p.returncode is None:
+                    p.kill()
+                await p.wait()
+            raise
+        finally:
+            # Pipe ends now belong to the child processes
+            if not is_last:
+                os.close(stdout)
+            if i > 0:
+                os.close(last_stdout)
         proc_list.append(p)
-        last_stdout = p.stdout
+        last_stdout = next_stdin
+
+    async def read_stderr(p):
+        return str(await p.stderr.read(), 'utf8', errors='replace')
 
-    # Print output of the last program in the chain
-    while p.poll() is None:
-        print(str(p.stdout.readline(), 'utf8'), end='')
+    async def read_stdout(p):
+        # Split lines here, as StreamReader lines are capped at 64 KiB
+        buf = bytearray()
+        while chunk := await p.stdout.read(2**16):
+            buf += chunk
+            end = buf.rfind(b'\n') + 1
+            if end == 0:
+                continue
+            for line in bytes(buf[:end]).splitlines(keepends=True):
+                on_stdout(str(line, 'utf8', errors='replace'))
+            del buf[:end]
+        if buf:
+            on_stdout(str(buf, 'utf8', errors='replace'))
 
-    # Run commands and make sure none fail
-    # stdout, stderr = p.communicate(input=stdin)
+    # Stream output of the last program and collect stderr of all of them
+    stderr_list, _ = await asyncio.gather(
+        asyncio.gather(*[read_stderr(p) for p in proc_list]),
+        read_stdout(proc_list[-1]),
+    )
     for p in proc_list:
-        p.wait()
-        if p.returncode != 0:
-            raise Exception("Subprocess command failed:", p.args)
+        await p.wait()
+
+    results = [
+        sp.CompletedProcess(c, p.returncode, stderr=e)
+        for c, p, e in zip(cmds, proc_list, stderr_list)
+    ]
+
+    # Make sure none failed. A stage killed by SIGPIPE is fine if a later
+    # stage succeeded (it just stopped reading early, like "head"); else
+    # blame the first stage that was not just killed by SIGPIPE.
+    sigpipe = (-signal.SIGPIPE, 128 + signal.SIGPIPE)
+    failed = [
+        r for i, r in enumerate(results)
+        if r.returncode != 0 and not (
+            r.returncode in sigpipe
+            and any(d.returncode == 0 for d in results[i + 1:])
+        )
+    ]
+    culprits = [r for r in failed if r.returncode not in sigpipe]
+    for r in (culprits or failed)[:1]:
+        raise sp.CalledProcessError(r.returncode, r.args, stderr=r.stderr)
+
+    return results
+
+
+async def cmd_pipes_async(
+    pipelines: list, max_concurrent=os.cpu_count(), on_stdout=None,
+) -> list[list[sp.CompletedProcess]]:
+    """Run many command pipelines concurrently.
+
+    At most "max_concurrent" pipelines run at once. All pipelines are run to
+    completion; then the first failure (if any) is raised. Results are
+    returned in order of "pipelines".
+    """
+
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def run(cmds):
+        async with semaphore:
+            return await cmd_pipe_async(cmds, on_stdout=on_stdout)
+
+    results = await asyncio.gather(
+        *[run(cmds) for cmds in pipelines], return_exceptions=True,
+    )
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+
+    return results
+
+
+def cmd_pipe(cmds, stdin=None) -> None:
+    """Chain system commands.
+
+    Run several system commands and pipe the output from one to the stdin
+    of the next. Synchronous wrapper around cmd_pipe_async.
+    """
+
+    asyncio.run(cmd_pipe_async(cmds, stdin=stdin))
 
-    # if stdout:
-    #     stdout = str(stdout, 'utf8').strip()
-    # if stderr:
-    #     stderr = str(stderr, 'utf8').strip()
 
-    # return stdout, stderr
+def cmd_pipes(
+    pipelines: list, max_concurrent=os.cpu_count(),
+) -> list[list[sp.CompletedProcess]]:
+    """Run many command pipelines concurrently (see cmd_pipes_async)."""
 
+    return asyncio.run(cmd_pipes_async(pipelines, max_concurrent))
 
-def gdaladdo(tif_path: Path) -> None:
-    """Generate pyramids for the given raster."""
 
-    sp.run(['gdaladdo', str(tif_path)], check=True)
+def run_cmd(cmd, **kwargs) -> sp.CompletedProcess:
+    """Run a system command and raise if it fails.
+
+    When called from within batch, the command runs with the batch's
+    per-job environment and its stderr is captured into the job's report.
+    """
+
+    job = BATCH_JOB.get()
+    if job is None:
+        return sp.run(cmd, check=True, **kwargs)
+
+    kwargs['env'] = {**os.environ, **job['env'], **kwargs.get('env', {})}
+    if not kwargs.get('capture_output'):
+        kwargs.setdefault('stderr', sp.PIPE)
+    try:
+        p = sp.run(cmd, check=True, **kwargs)
+    except sp.CalledProcessError as e:
+        job['stderr'].append(e.stderr)
+        raise
+    job['stderr'].append(p.stderr)
+
+    return p
+
+
+def run_batch_job(fn: Callable, args, env: dict) -> dict:
+    """Run one batch job and report its result, error, timing and stderr.
+
+    "env" is passed to system commands started with run_cmd, and its GDAL
+    options also apply to rasterio calls made by the job (rio.Env is per
+    thread). Other variables, such as OMP_NUM_THREADS, cannot be changed
+    for in-process libraries once they are loaded.
+    """
+
+    if isinstance(args, dict):
+        args, kwargs = (), args
+    elif isinstance(args, (list, tuple)):
+        kwargs = {}
+    else:
+        args, kwargs = (args,), {}
+
+    job = {'env': env, 'stderr': []}
+    token = BATCH_JOB.set(job)
+    start = time.perf_counter()
+    result, error = None, None
+    try:
+        gdal_env = {k: v for k, v in env.items() if k.startswith('GDAL_')}
+        with rio.Env(**gdal_env):
+            result = fn(*args, **kwargs)
+    except Exception as e:
+        error = e
+    finally:
+        BATCH_JOB.reset(token)
+
+    stderr = ''.join(
+        str(e, 'utf8', errors='replace') if isinstance(e, bytes) else e
+        for e in job['stderr'] if e
+    )
+
+    return {
+        'result': result,
+        'error': error,
+        'seconds': time.perf_counter() - start,
+        'stderr': stderr,
+    }
+
+
+def batch(
+    fn: Callable,
+    arg_sets: iter,
+    max_workers=os.cpu_count(),
+    threads: int = None,
+) -> Iterator[(Any, dict)]:
+    """Run a system tool wrapper over many argument sets concurrently.
+
+    "fn" is one of the wrappers in this module (e.g. gdaladdo, vrt2tif,
+    clip_rast) and each item of "arg_sets" is a tuple of positional args, a
+    dict of keyword args, or a single argument. At most "max_workers" jobs
+    run at once; each job's tools are limited to "threads" threads
+    (default: CPU count split evenly between workers) so concurrent GDAL
+    processes (and in-process GDAL calls) do not oversubscribe the
+    machine. Yield (args, report) in the order jobs finish, where report
+    holds the job's "result", "error" (the exception raised, if any),
+    "seconds" and captured "stderr".
+    """
+
+    threads = threads or max(1, os.cpu_count() // max_workers)
+    env = {
+        'GDAL_NUM_THREADS': str(threads),
+        'OMP_NUM_THREADS': str(threads),
+    }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures_args = {
+            executor.submit(run_batch_job, fn, a, env): a for a in arg_sets
+        }
+        for f in as_completed(futures_args):
+            yield (futures_args[f], f.result())
+
+
+def gdal_path(rast) -> str:
+    """Return the path GDAL should open for a raster argument.
+
+    Raster functions accept filesystem paths as well as GDAL in-memory
+    datasets ("/vsimem/" paths or rasterio MemoryFile objects).
+    """
+
+    return vsimem_path(rast) or str(rast)
+
+
+@contextmanager
+def on_disk(in_rasts: list, out_rast=None) -> Iterator[tuple]:
+    """Give external GDAL utilities filesystem paths for in-memory rasters.
+
+    In-memory datasets only exist inside this process, so in-memory inputs
+    are copied (uncompressed) to a temporary directory, and an in-memory
+    output is written there and loaded into memory on exit. Yield the list
+    of input paths and the output path. Filesystem paths pass through.
+    """
+
+    with TemporaryDirectory() as tmpdir:
+        in_paths = []
+        for i, rast in enumerate(in_rasts):
+            if vsimem_path(rast):
+                path = str(Path(tmpdir, f"in{i}.tif"))
+                rio_copy(vsimem_path(rast), path, driver='GTiff')
+                in_paths.append(path)
+            else:
+                in_paths.append(str(rast))
+        if out_rast is not None and vsimem_path(out_rast):
+            out_path = str(Path(tmpdir, 'out.tif'))
+        else:
+            out_path = None if out_rast is None else str(out_rast)
+
+        yield in_paths, out_path
+
+        if out_rast is not None and vsimem_path(out_rast):
+            rio_copy(out_path, vsimem_path(out_rast), driver='GTiff')
+
+
+def overview_levels(rast_path: Path, min_size=256) -> list[int]:
+    """Pick overview decimation factors for a raster.
+
+    Levels double until the smallest overview fits within "min_size"
+    pixels, matching GDAL's automatic level selection.
+    """
+
+    with rio.open(gdal_path(rast_path)) as f:
+        size = max(f.width, f.height)
+
+    levels = []
+    factor = 1
+    while -(-size // factor) > min_size:
+        factor *= 2
+        levels.append(factor)
+
+    return levels
+
+
+def rast_grid(rast_path: Path) -> dict:
+    """Return the size, geotransform and sources of a raster as a dict.
+
+    "sources" maps each file the raster reads from (e.g. the tiles of a VRT
+    mosaic, but not its overviews) to its modification time.
+    """
+
+    with rio.open(rast_path) as f:
+        src_paths = [
+            p for p in f.files
+            if Path(p) != Path(rast_path)
+            and not p.lower().endswith(('.ovr', '.aux.xml', '.ovr.json'))
+        ]
+        grid = {
+            'width': f.width,
+            'height': f.height,
+            'transform': list(f.transform)[:6],
+        }
+    grid['sources'] = {p: os.stat(p).st_mtime for p in src_paths}
+
+    return grid
+
+
+def ovr_is_stale(old_grid: dict, grid: dict, ovr_mtime: float) -> bool:
+    """Tell if overviews built for "old_grid" cannot be refreshed in place.
+
+    Partial refreshes only pick up sources newer than the overviews, so the
+    overviews are stale if the raster grid changed, a source disappeared or
+    went back in time, or a new source is not newer than the overviews.
+    """
+
+    if any(old_grid.get(k) != grid[k] for k in grid if k != 'sources'):
+        return True
+    if 'sources' not in old_grid:
+        return True
+    old_sources, sources = old_grid['sources'], grid['sources']
+    if not old_sources.keys() <= sources.keys():
+        return True
+    for p, mtime in sources.items():
+        if p in old_sources and mtime < old_sources[p]:
+            return True
+        if p not in old_sources and mtime <= ovr_mtime:
+            return True
+
+    return False
+
+
+def gdaladdo(
+    tif_path: Path,
+    resampling='nearest',
+    levels: list[int] = None,
+    threads: int | str = None,
+    incremental=False,
+) -> None:
+    """Generate pyramids for the given raster.
+
+    Overview levels are chosen automatically unless given. "threads"
+    defaults to all CPUs (or the per-job share when run under batch). With
+    "incremental", a VRT mosaic that already has overviews only gets the
+    overview blocks refreshed whose source tiles are newer than the
+    overviews; otherwise all levels are (re)built. The raster grid and
+    source files (with modification times) the overviews were built from
+    are recorded in "<tif_path>.ovr.json"; if they no longer match in a way
+    a partial refresh cannot fix (see ovr_is_stale), the stale overviews
+    are deleted and rebuilt.
+    """
+
+    # In-memory rasters are only visible to this process
+    if vsimem_path(tif_path):
+        if levels is None:
+            levels = overview_levels(tif_path)
+        with rio.open(vsimem_path(tif_path), 'r+') as f:
+            f.build_overviews(levels, Resampling[resampling])
+        return
+
+    cmd = ['gdaladdo', '-r', resampling]
+    if threads is None and BATCH_JOB.get() is None:
+        threads = 'ALL_CPUS'
+    if threads is not None:
+        cmd += ['--config', 'GDAL_NUM_THREADS', str(threads)]
+
+    # Drop external overviews built for a different raster grid
+    tif_path = Path(tif_path)
+    ovr_path = Path(f"{tif_path}.ovr")
+    grid_path = Path(f"{tif_path}.ovr.json")
+    grid = rast_grid(tif_path)
+    has_ovr = ovr_path.exists()
+    if has_ovr:
+        try:
+            with grid_path.open('r') as f:
+                old_grid = json.load(f)
+            has_ovr = not ovr_is_stale(
+                old_grid, grid, ovr_path.stat().st_mtime,
+            )
+        except (OSError, ValueError, AttributeError):
+            has_ovr = False
+        if not has_ovr:
+            log.info("Rebuilding stale overviews: %s", ovr_path)
+            ovr_path.unlink()
+
+    # Only refresh what changed if matching overviews already exist
+    if incremental and has_ovr and tif_path.suffix.lower() == '.vrt':
+        cmd += ['--partial-refresh-from-source-timestamp', str(tif_path)]
+    else:
+        if levels is None:
+            levels = overview_levels(tif_path)
+        cmd += [str(tif_path), *[str(i) for i in levels]]
+
+    run_cmd(cmd)
+
+    # Record grid overviews were built for
+    if ovr_path.exists():
+        with grid_path.open('w') as f:
+            json.dump(grid, f)
+
+
+def rast_header(rast_path: Path) -> dict:
+    """Read the georeferencing and band layout of a raster."""
+
+    stat = os.stat(rast_path)
+    with rio.open(rast_path) as f:
+        return {
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'width': f.width,
+            'height': f.height,
+            'count': f.count,
+            'dtypes': list(f.dtypes),
+            'nodata': f.nodatavals[0],
+            'transform': list(f.transform.to_gdal()),
+            'crs': f.crs.to_wkt() if f.crs else None,
+            'block_shapes': [list(b) for b in f.block_shapes],
+            'colorinterp': [c.name.capitalize() for c in f.colorinterp],
+        }
+
+
+def rast_headers(
+    rast_paths: list[Path],
+    cache_path: Path = None,
+    max_workers=os.cpu_count(),
+) -> dict[str, dict]:
+    """Read raster headers in parallel, caching them by file mtime.
+
+    If "cache_path" is given, headers are kept in that JSON index and only
+    rasters that are new, or whose mtime or size changed, are opened.
+    Returns a dict of header dicts keyed by absolute path string.
+    """
+
+    # Load existing index
+    index = {}
+    if cache_path and Path(cache_path).exists():
+        with open(cache_path, 'r') as f:
+            index = json.load(f)
+
+    # Find rasters whose cached header is missing or stale
+    keys = [str(Path(p).absolute()) for p in rast_paths]
+    todo = []
+    for k in keys:
+        stat = os.stat(k)
+        entry = index.get(k)
+        if not (
+            entry
+            and entry['mtime'] == stat.st_mtime
+            and entry['size'] == stat.st_size
+        ):
+            todo.append(k)
+
+    # Read stale headers in parallel
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for k, header in zip(todo, executor.map(rast_header, todo)):
+            index[k] = header
+
+    # Save index, dropping rasters that no longer exist
+    if cache_path and todo:
+        index = {k: v for k, v in index.items() if os.path.exists(k)}
+        tmp_path = Path(f"{cache_path}.tmp")
+        with tmp_path.open('w') as f:
+            json.dump(index, f)
+        tmp_path.replace(cache_path)
+
+    return {k: index[k] for k in keys}
+
+
+def write_vrt(
+    src_paths: list[Path],
+    dst_path: Path,
+    cache_path: Path = None,
+    max_workers=os.cpu_count(),
+) -> None:
+    """Create virtual mosaic from a list of rasters, without GDAL utilities.
+
+    Writes the same XML gdalbuildvrt does with default options: union
+    extent, average resolution, sources in list order (later on top),
+    band nodata and color interpretation taken from the first raster, and
+    each source masked with its own nodata value. Rasters whose CRS, band
+    count or data types differ from the first one, or that are rotated,
+    are skipped with a warning. Source headers come from rast_headers,
+    cached in "cache_path" (default: "<dst_path>.idx.json"), so rebuilding
+    after adding or removing a few tiles only opens the new ones.
+    """
+
+    dst_path = Path(dst_path)
+    vrt_dir = dst_path.absolute().parent
+    if cache_path is None:
+        cache_path = Path(f"{dst_path}.idx.json")
+    headers = rast_headers(src_paths, cache_path, max_workers)
+
+    # Drop sources incompatible with the first one, like gdalbuildvrt
+    sources = []
+    for path, h in headers.items():
+        first = sources[0][1] if sources else h
+        same_crs = h['crs'] == first['crs'] or bool(
+            h['crs'] and first['crs']
+            and CRS.from_wkt(h['crs']) == CRS.from_wkt(first['crs'])
+        )
+        if h['transform'][2] or h['transform'][4]:
+            log.warning("Skipping rotated raster: %s", path)
+        elif not same_crs or h['count'] != first['count']:
+            log.warning("Skipping raster with different CRS/bands: %s", path)
+        elif h['dtypes'] != first['dtypes']:
+            log.warning("Skipping raster with different data type: %s", path)
+        else:
+            sources.append((path, h))
+    if not sources:
+        raise ValueError("No usable source rasters for VRT")
+    first = sources[0][1]
+
+    # Compute mosaic extent and average resolution
+    res_x = np.mean([h['transform'][1] for _, h in sources])
+    res_y = np.mean([-h['transform'][5] for _, h in sources])
+    min_x = min(h['transform'][0] for _, h in sources)
+    max_y = max(h['transform'][3] for _, h in sources)
+    max_x = max(
+        h['transform'][0] + h['width'] * h['transform'][1] for _, h in sources
+    )
+    min_y = min(
+        h['transform'][3] + h['height'] * h['transform'][5]
+        for _, h in sources
+    )
+    width = int((max_x - min_x) / res_x + 0.5)
+    height = int((max_y - min_y) / res_y + 0.5)
+
+    # Build VRT XML
+    vrt = ET.Element(
+        'VRTDataset', rasterXSize=str(width), rasterYSize=str(height),
+    )
+    if first['crs']:
+        ET.SubElement(
+            vrt, 'SRS', dataAxisToSRSAxisMapping='1,2',
+        ).text = first['crs']
+    ET.SubElement(vrt, 'GeoTransform').text = ', '.join(
+        f"{v:.16g}" for v in (min_x, res_x, 0.0, max_y, 0.0, -res_y)
+    )
+    for b in range(first['count']):
+        dtype = GDAL_DTYPES[first['dtypes'][b]]
+        band = ET.SubElement(
+            vrt, 'VRTRasterBand', dataType=dtype, band=str(b + 1),
+        )
+        nodata = first['nodata']
+        if nodata is not None:
+            ET.SubElement(band, 'NoDataValue').text = f"{nodata:.18g}"
+        ET.SubElement(band, 'ColorInterp').text = first['colorinterp'][b]
+
+        for path, h in sources:
+            src_nodata = h['nodata']
+            src = ET.SubElement(
+                band,
+                'ComplexSource' if src_nodata is not None else 'SimpleSource',
+            )
+
+            # Reference source relative to VRT if it lies below VRT's dir
+            rel_path = os.path.relpath(path, vrt_dir)
+            if rel_path.startswith('..'):
+                ET.SubElement(
+                    src, 'SourceFilename', relativeToVRT='0',
+                ).text = path
+            else:
+                ET.SubElement(
+                    src, 'SourceFilename', relativeToVRT='1',
+                ).text = rel_path
+
+            ET.SubElement(src, 'SourceBand').text = str(b + 1)
+            block_y, block_x = h['block_shapes'][b]
+            ET.SubElement(
+                src,
+                'SourceProperties',
+                RasterXSize=str(h['width']),
+                RasterYSize=str(h['height']),
+                DataType=GDAL_DTYPES[h['dtypes'][b]],
+                BlockXSize=str(block_x),
+                BlockYSize=str(block_y),
+            )
+            ET.SubElement(
+                src,
+                'SrcRect',
+                xOff='0',
+                yOff='0',
+                xSize=str(h['width']),
+                ySize=str(h['height']),
+            )
+            src_res_x, src_res_y = h['transform'][1], -h['transform'][5]
+            ET.SubElement(
+                src,
+                'DstRect',
+                xOff=f"{(h['transform'][0] - min_x) / res_x:.15g}",
+                yOff=f"{(max_y - h['transform'][3]) / res_y:.15g}",
+                xSize=f"{h['width'] * src_res_x / res_x:.15g}",
+                ySize=f"{h['height'] * src_res_y / res_y:.15g}",
+            )
+            if src_nodata is not None:
+                ET.SubElement(src, 'NODATA').text = f"{src_nodata:.18g}"
+
+    # Write VRT atomically
+    ET.indent(vrt, space='  ')
+    tmp_path = dst_path.with_name(f".{dst_path.name}.tmp")
+    ET.ElementTree(vrt).write(tmp_path, encoding='unicode')
+    tmp_path.replace(dst_path)
+
+
+def vrt_sources(vrt_path: Path) -> list[Path]:
+    """List the source rasters of a VRT (in mosaic order)."""
+
+    vrt_path = Path(vrt_path)
+    band = ET.parse(vrt_path).getroot().find('VRTRasterBand')
+    if band is None:
+        return []
+
+    paths = []
+    for elem in band.iter('SourceFilename'):
+        path = Path(elem.text)
+        if elem.get('relativeToVRT') == '1':
+            path = vrt_path.absolute().parent / path
+        paths.append(path)
+
+    return paths
+
+
+def vrt_add_sources(
+    vrt_path: Path, add_paths: list[Path], max_workers=os.cpu_count(),
+) -> None:
+    """Add rasters to an existing VRT (on top of the current sources).
+
+    Headers of sources already in the VRT come from its header index, so
+    only the added rasters are opened.
+    """
+
+    paths = vrt_sources(vrt_path)
+    known = {p.absolute() for p in paths}
+    paths += [p for p in map(Path, add_paths) if p.absolute() not in known]
+    write_vrt(paths, vrt_path, max_workers=max_workers)
+
+
+def vrt_remove_sources(vrt_path: Path, remove_paths: list[Path]) -> None:
+    """Remove rasters from an existing VRT.
+
+    Headers of the remaining sources come from the VRT's header index, so
+    no raster is opened if the index is current.
+    """
+
+    remove = {Path(p).absolute() for p in remove_paths}
+    paths = [p for p in vrt_sources(vrt_path) if p.absolute() not in remove]
+    write_vrt(paths, vrt_path)
 
 
 def gdal_build_vrt(
@@ -110,25 +852,33 @@ def gdal_build_vrt(
     dst_pth: Path,
     pyramids=False,
 ) -> None:
-    """Create virtual mosaic from a list of rasters using GDAL."""
-
-    with NamedTemporaryFile(suffix='.txt', buffering=0) as f:
-        # Write list of source rasters to file
-        for p in src_paths:
-            f.write(bytes(p))
-            f.write(b'\n')
+    """Create virtual mosaic from a list of rasters (see write_vrt)."""
 
-        # Run GDAL to build virtual raster from source rasters
-        cmd = ['gdalbuildvrt', '-input_file_list', f.name, dst_pth]
-        sp.run(cmd, check=True)
+    write_vrt(src_paths, dst_pth)
 
-    # If requested, generate pyramids for mosaic
+    # If requested, generate pyramids for mosaic (only refreshing overviews
+    # of changed tiles if the mosaic already has them)
     if pyramids:
-        gdaladdo(dst_pth)
+        gdaladdo(dst_pth, incremental=True)
 
 
+@memoize_files('out_path')
 def vrt2tif(vrt_path: Path, out_path: Path, big=False) -> None:
-    """Convert a virtual raster mosaic into a real mosaic using GDAL."""
+    """Convert a virtual raster mosaic into a real mosaic using GDAL.
+
+    Either side may be an in-memory dataset (see gdal_path), in which case
+    the copy is done in-process, and an in-memory output is left
+    uncompressed.
+    """
+
+    if vsimem_path(vrt_path) or vsimem_path(out_path):
+        opts = {'TILED': 'YES'}
+        if not vsimem_path(out_path):
+            opts.update(COMPRESS='LZW', BIGTIFF='YES' if big else 'IF_NEEDED')
+        rio_copy(
+            gdal_path(vrt_path), gdal_path(out_path), driver='GTiff', **opts,
+        )
+        return
 
     # Setup command arguments
     cmd = [
@@ -141,7 +891,117 @@ def vrt2tif(vrt_path: Path, out_path: Path, big=False) -> None:
 
     # Run GDAL
     cmd += [str(vrt_path), str(out_path)]
-    sp.run(cmd, check=True)
+    run_cmd(cmd)
+
+
+def gdal_translate(
+    src_path: Path,
+    dst_path: Path,
+    creation_opts: dict = None,
+    out_format='GTiff',
+    srcwin: tuple[int, int, int, int] = None,
+) -> None:
+    """Convert a raster (or a pixel window of it) to a new raster using GDAL.
+
+    "srcwin" is (xoff, yoff, xsize, ysize) in pixels. Either raster may be
+    in memory (see gdal_path).
+    """
+
+    with on_disk([src_path], dst_path) as ([src], dst):
+        cmd = ['gdal_translate', '-of', out_format]
+        for k, v in (creation_opts or {}).items():
+            cmd += ['-co', f"{k}={v}"]
+        if srcwin:
+            cmd += ['-srcwin', *[str(i) for i in srcwin]]
+        cmd += [src, dst]
+        run_cmd(cmd)
+
+
+def vrt2cog(
+    vrt_path: Path,
+    out_path: Path,
+    compress='ZSTD',
+    predictor: int = None,
+    level: int = None,
+    resampling='nearest',
+    block_size=512,
+    strip_rows: int = None,
+    max_workers=os.cpu_count(),
+) -> None:
+    """Convert a virtual raster mosaic into a Cloud-Optimized GeoTIFF.
+
+    The VRT extent is split into horizontal strips aligned to "block_size"
+    which are translated concurrently (reading and resampling the VRT
+    sources in parallel), then assembled into a COG with internal overviews
+    by GDAL's COG driver, compressing with all cores. Strips are written
+    uncompressed so the final pass only pays for one encode. With a single
+    worker or strip, the COG is built straight from the VRT. "predictor"
+    defaults to 2 (horizontal differencing) for integer rasters and 3
+    (floating point) for float rasters.
+    """
+
+    vrt_path, out_path = Path(vrt_path), Path(out_path)
+
+    # Get mosaic dimensions
+    with rio.open(vrt_path) as f:
+        width, height = f.width, f.height
+        is_float = any(d.startswith('float') for d in f.dtypes)
+    if predictor is None:
+        predictor = 3 if is_float else 2
+
+    cog_opts = {
+        'COMPRESS': compress,
+        'PREDICTOR': predictor,
+        'BLOCKSIZE': block_size,
+        'BIGTIFF': 'IF_SAFER',
+        'NUM_THREADS': 'ALL_CPUS',
+        'OVERVIEWS': 'AUTO',
+        'RESAMPLING': resampling.upper(),
+    }
+    if level is not None:
+        cog_opts['LEVEL'] = level
+
+    # Split mosaic into block-aligned strips, a few per worker
+    if strip_rows is None:
+        strip_rows = -(-height // (max_workers * 4))
+    strip_rows = max(1, -(-strip_rows // block_size)) * block_size
+    strip_opts = {
+        'TILED': 'YES',
+        'BLOCKXSIZE': block_size,
+        'BLOCKYSIZE': block_size,
+        'COMPRESS': 'NONE',
+        'BIGTIFF': 'YES',
+    }
+
+    # Strips only pay off when they can be read in parallel
+    if max_workers <= 1 or strip_rows >= height:
+        gdal_translate(vrt_path, out_path, cog_opts, out_format='COG')
+        return
+
+    # Put intermediate strips on the same file system as the output
+    with TemporaryDirectory(dir=out_path.parent) as tmpdir:
+        strips = []
+        jobs = []
+        for i, yoff in enumerate(range(0, height, strip_rows)):
+            strip_path = Path(tmpdir, f"strip{i:05d}.tif")
+            srcwin = (0, yoff, width, min(strip_rows, height - yoff))
+            strips.append(strip_path)
+            jobs.append({
+                'src_path': vrt_path,
+                'dst_path': strip_path,
+                'creation_opts': strip_opts,
+                'srcwin': srcwin,
+            })
+
+        # Translate strips in parallel
+        for _, report in batch(gdal_translate, jobs, max_workers):
+            if report['error']:
+                raise report['error']
+
+        # Assemble strips into final COG
+        strips_vrt = Path(tmpdir, "strips.vrt")
+        gdal_build_vrt(strips, strips_vrt)
+        gdal_translate(strips_vrt, out_path, cog_opts, out_format='COG')
 
 
 def build_vpc(in_paths: list[Path], out_path: Path) -> None:
@@ -166,7 +1026,7 @@ def build_vpc(in_paths: list[Path], out_path: Path) -> None:
             '--input-file-list', assets_list_txt,
             '--output', out_path,
         )
-        sp.run(cmd, check=True)
+        run_cmd(cmd)
 
 
 def find(
@@ -192,14 +1052,34 @@ def find(
     return [Path(p) for p in proc.stdout.strip().splitlines()]
 
 
-def clip_rast(in_rast: Path, out_rast: Path, bounds: GeoDataFrame) -> None:
-    """Clip a given raster to a given polygon."""
+@memoize_files('out_rast')
+def clip_rast(
+    in_rast: Path | list[Path], out_rast: Path, bounds: GeoDataFrame,
+) -> None:
+    """Clip a given raster to a given polygon.
+
+    "in_rast" may also be a list of rasters sharing a CRS (e.g. candidates
+    from extlib.select_files), in which case only those are warped and
+    mosaicked, instead of a whole VRT. Inputs and output may be in memory
+    (see gdal_path); an in-memory output is not compressed.
+    """
+
+    if isinstance(in_rast, (list, tuple)):
+        in_rasts = list(in_rast)
+    else:
+        in_rasts = [in_rast]
+    if not in_rasts:
+        raise ValueError("No input rasters to clip")
 
     # Get raster CRS
-    with rio.open(in_rast, 'r') as f:
+    with rio.open(gdal_path(in_rasts[0]), 'r') as f:
         rast_crs = f.crs
 
-    with TemporaryDirectory() as tmpdir:
+    compress = 'NONE' if vsimem_path(out_rast) else 'LZW'
+    with (
+        on_disk(in_rasts, out_rast) as (in_rasts, out_rast),
+        TemporaryDirectory() as tmpdir,
+    ):
         # Save bounds polygon to file so GDAL utility can read it
         bounds_path = Path(tmpdir, "bounds.fgb")
         bounds.to_crs(rast_crs).to_file(bounds_path)
@@ -212,12 +1092,12 @@ def clip_rast(in_rast: Path, out_rast: Path, bounds: GeoDataFrame) -> None:
             '-crop_to_cutline',
             '-dstalpha',
             '-co', 'BIGTIFF=YES',
-            '-co', 'COMPRESS=LZW',
+            '-co', f"COMPRESS={compress}",
             '-co', 'TILED=YES',
-            str(in_rast),
-            str(out_rast),
+            *in_rasts,
+            out_rast,
         )
-        sp.run(cmd, check=True)
+        run_cmd(cmd)
 
 
 def get_las_crs(las_path: Path) -> str:
@@ -227,6 +1107,21 @@ def get_las_crs(las_path: Path) -> str:
         '--metadata',
         str(las_path),
     )
-    p = sp.run(cmd, check=True, text=True, capture_output=True)
+    p = run_cmd(cmd, text=True, capture_output=True)
 
     return json.loads(p.stdout)['metadata']['srs']['compoundwkt']
+
+
+def laz2las(src_path: Path, dst_path: Path) -> None:
+    """Decompress a LAZ file to LAS, keeping header and VLRs, using PDAL."""
+
+    cmd = (
+        'pdal',
+        'translate',
+        str(src_path),
+        str(dst_path),
+        '--writers.las.forward=all',
+        '--writers.las.extra_dims=all',
+        '--writers.las.compression=false',
+    )
+    run_cmd(cmd)
@@ -14,11 +14,33 @@
 
 # Import standard libraries
 import os
+import re
 import sys
+import json
+import time
+import atexit
+import errno
+import queue
+import shutil
+import struct
+import hashlib
+import inspect
+import sqlite3
 import logging
+import logging.handlers
+import functools
+import multiprocessing
+import threading
+import xml.etree.ElementTree as ET
 from pathlib import Path
+from tempfile import mkdtemp
+from contextlib import closing
+from contextvars import ContextVar
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait as cf_wait
 from concurrent.futures import as_completed as cf_as_completed
 
 from typing import Any
@@ -32,6 +54,43 @@ from collections.abc import Iterator
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 
+# File cache used by memoize_files (disabled unless a directory is set)
+FILE_CACHE_DIR = os.environ.get('VOGELER_CACHE_DIR')
+FILE_CACHE_MAX_BYTES = int(
+    os.environ.get('VOGELER_CACHE_MAX_BYTES', 100 * 2**30)
+)
+SHP_SIDECAR_EXTS = ('.shx', '.dbf', '.prj', '.cpg', '.sbn', '.sbx', '.qix')
+
+# Logging (see init_logger)
+LOG_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+QUEUE_LOG_FORMAT = (
+    '%(asctime)s %(levelname)s [%(process)d job %(job_id)s] %(message)s'
+)
+LOG_JOB_ID = ContextVar('LOG_JOB_ID', default='-')
+LOG_LISTENER = {}  # Listener started by init_logger(queued=True)
+
+# Publishing (see publish)
+PUBLISH_CHUNK_SIZE = 64 * 2**20
+PUBLISH_MANIFEST = 'publish_manifest.json'
+
+# fd-style result type names
+FIND_TYPES = {
+    'f': 'f', 'file': 'f',
+    'd': 'd', 'dir': 'd', 'directory': 'd',
+    'l': 'l', 'symlink': 'l',
+    'x': 'x', 'executable': 'x',
+    'e': 'e', 'empty': 'e',
+}
+
+# File extensions of each catalog file kind
+CATALOG_KINDS = {
+    'raster': ('.tif', '.tiff', '.vrt', '.img', '.jp2', '.asc', '.nc'),
+    'las': ('.las', '.laz', '.vpc'),
+    'vector': (
+        '.shp', '.gpkg', '.fgb', '.geojson', '.parquet', '.kml', '.gdb',
+    ),
+}
+
 MET20M_DIR = 'SD_BlackHills_D23/GridMetrics/Metrics_20Meters/'
 STRAT_DIR = 'SD_BlackHills_D23/GridMetrics/StrataMetrics_20Meters/'
 NAMING_MAP = {
@@ -505,10 +564,433 @@ def timestamp() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M")
 
 
-def lsdir(d: Path) -> Iterator[Path]:
-    """Return iterable of paths for the given directory (sans hidden files)."""
+def lsdir(d: Path, catalog: Path = None) -> Iterator[Path]:
+    """Return iterable of paths for the given directory (sans hidden files).
+
+    If a "catalog" database (see catalog_refresh) is given, the listing is
+    answered from it instead of the file system.
+    """
+
+    if catalog is None:
+        yield from d.glob("[!.]*")
+        return
+
+    with closing(catalog_connect(catalog)) as con:
+        rows = con.execute(
+            "SELECT name FROM entries WHERE dir = ?", (os.path.abspath(d),),
+        )
+        for name, in rows:
+            yield Path(d, name)
+
+
+def scan_dir(d: str, cache: dict = None) -> list[tuple]:
+    """List a directory as (name, is_dir, is_file, is_symlink) tuples.
+
+    If a "cache" dict is given, listings are stored in it keyed by
+    directory path and reused for as long as the directory's mtime is
+    unchanged.
+    """
+
+    if cache is None:
+        with os.scandir(d) as it:
+            return [
+                (
+                    e.name,
+                    e.is_dir(follow_symlinks=False),
+                    e.is_file(follow_symlinks=False),
+                    e.is_symlink(),
+                )
+                for e in it
+            ]
+
+    # Revalidate cached listing against directory mtime
+    mtime = os.stat(d).st_mtime_ns
+    cached = cache.get(d)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    entries = scan_dir(d)
+    cache[d] = (mtime, entries)
+
+    return entries
+
+
+def find(
+    query: str,
+    dir_list: list[Path],
+    ignore_case=False,
+    result_type: list[str] = None,
+    fixed_strs=False,
+    cache: dict = None,
+    max_workers: int = None,
+    catalog: Path = None,
+) -> Iterator[Path]:
+    """Yield files matching the given query in the given directories.
+
+    In-process, streaming counterpart of sp.find with fd's defaults: the
+    query is a regex (or a literal with "fixed_strs") searched for in file
+    names, case-insensitively unless the query contains an uppercase letter
+    (or always, with "ignore_case"); hidden files are skipped and symlinked
+    directories are not followed. Unlike fd, .gitignore files are not
+    honored. "result_type" takes fd's type names (f, d, l, x, e).
+    Directories are scanned on a thread pool and matches are yielded as soon
+    as they are found, in no particular order. Pass the same "cache" dict
+    to later calls to reuse listings of directories whose mtime has not
+    changed (see scan_dir). If a "catalog" database (see catalog_refresh)
+    is given, matches are looked up in it instead of walking the tree.
+    """
+
+    # Compile query
+    if fixed_strs:
+        query = re.escape(query)
+    case_sensitive = not ignore_case and any(c.isupper() for c in query)
+    pattern = re.compile(query, 0 if case_sensitive else re.IGNORECASE)
+    types = {FIND_TYPES[t] for t in result_type or ()}
+
+    def type_matches(path, is_dir, is_file, is_link):
+        if not types:
+            return True
+        if 'f' in types and is_file:
+            return True
+        if 'd' in types and is_dir:
+            return True
+        if 'l' in types and is_link:
+            return True
+        if 'x' in types and is_file and os.access(path, os.X_OK):
+            return True
+        if 'e' in types:
+            # An entry that vanished or cannot be read is not a match, but
+            # must not end the scan of the rest of its directory
+            try:
+                if is_file and os.path.getsize(path) == 0:
+                    return True
+                if is_dir and not os.listdir(path):
+                    return True
+            except OSError:
+                return False
+        return False
+
+    for d in dir_list:
+        if not os.path.isdir(d):
+            raise FileNotFoundError("Search path is not a directory:", d)
+
+    # Answer from file catalog if one is given
+    if catalog is not None:
+        yield from catalog_query(
+            catalog,
+            regex=pattern,
+            under=dir_list,
+            result_type=types,
+            relative_to=dir_list,
+        )
+        return
+
+    dirs = queue.Queue()
+    results = queue.Queue()
+    stop = threading.Event()
+    lock = threading.Lock()
+    pending = len(dir_list)
+    done = object()
+
+    def worker():
+        nonlocal pending
+        while True:
+            d = dirs.get()
+            if d is None or stop.is_set():
+                return
+            try:
+                for name, is_dir, is_file, is_link in scan_dir(d, cache):
+                    if name.startswith('.'):
+                        continue
+                    path = os.path.join(d, name)
+                    if is_dir:
+                        with lock:
+                            pending += 1
+                        dirs.put(path)
+                    if pattern.search(name) and type_matches(
+                        path, is_dir, is_file, is_link,
+                    ):
+                        results.put(path)
+            except OSError:
+                pass  # Skip unreadable directories, like fd
+            finally:
+                with lock:
+                    pending -= 1
+                    if pending == 0:
+                        results.put(done)
+
+    # Walk directories on a thread pool
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+    for d in dir_list:
+        dirs.put(str(d))
+    threads = [
+        threading.Thread(target=worker, daemon=True)
+        for _ in range(max_workers)
+    ]
+    for t in threads:
+        t.start()
+
+    # Yield matches as they arrive
+    try:
+        if dir_list:
+            while (path := results.get()) is not done:
+                yield Path(path)
+    finally:
+        stop.set()
+        for _ in threads:
+            dirs.put(None)
+
+
+def catalog_connect(db_path: Path) -> sqlite3.Connection:
+    """Open (and if needed create) a file catalog database."""
+
+    con = sqlite3.connect(db_path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript("""
+        CREATE TABLE IF NOT EXISTS dirs (
+            path TEXT PRIMARY KEY,
+            mtime INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            path TEXT PRIMARY KEY,
+            dir TEXT NOT NULL,
+            name TEXT NOT NULL,
+            ext TEXT,
+            type TEXT,
+            kind TEXT,
+            size INTEGER,
+            mtime REAL
+        );
+        CREATE INDEX IF NOT EXISTS entries_dir ON entries(dir);
+        CREATE INDEX IF NOT EXISTS entries_name ON entries(name);
+        CREATE INDEX IF NOT EXISTS entries_ext ON entries(ext);
+        CREATE INDEX IF NOT EXISTS entries_kind ON entries(kind);
+    """)
+    con.create_function(
+        'REGEXP',
+        2,
+        lambda pattern, s: re.search(pattern, s) is not None,
+        deterministic=True,
+    )
 
-    yield from d.glob("[!.]*")
+    return con
+
+
+def catalog_scan_dir(d: str) -> tuple[int, list[tuple]]:
+    """Stat a directory and its (non-hidden) entries for the file catalog."""
+
+    mtime = os.stat(d).st_mtime_ns
+    kinds = {e: k for k, exts in CATALOG_KINDS.items() for e in exts}
+    rows = []
+    with os.scandir(d) as it:
+        for e in it:
+            if e.name.startswith('.'):
+                continue
+            try:
+                st = e.stat(follow_symlinks=False)
+            except OSError:
+                continue  # Entry vanished while scanning
+            if e.is_symlink():
+                kind_type = 'l'
+            elif e.is_dir(follow_symlinks=False):
+                kind_type = 'd'
+            else:
+                kind_type = 'f'
+            ext = os.path.splitext(e.name)[1].lower()
+            rows.append((
+                e.path,
+                d,
+                e.name,
+                ext,
+                kind_type,
+                kinds.get(ext),
+                st.st_size,
+                st.st_mtime,
+            ))
+
+    return mtime, rows
+
+
+def catalog_refresh(
+    db_path: Path,
+    roots: list[Path],
+    full=False,
+    max_workers: int = None,
+) -> None:
+    """Record path, size, mtime, type and kind of all files under roots.
+
+    Creates or updates a SQLite file catalog at "db_path". Only directories
+    whose mtime changed since the last refresh are rescanned (in parallel);
+    unchanged directories are skipped and their subdirectories taken from
+    the catalog. Since editing a file in place does not change its
+    directory's mtime, sizes and mtimes of such files go stale until a
+    refresh with "full" rescans everything. Entry kinds ("raster", "las",
+    "vector") are assigned by file extension (see CATALOG_KINDS).
+    """
+
+    roots = [os.path.abspath(r) for r in roots]
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+
+    with closing(catalog_connect(db_path)) as con, con:
+        known_mtimes = dict(con.execute("SELECT path, mtime FROM dirs"))
+
+        def visit(d):
+            try:
+                mtime = os.stat(d).st_mtime_ns
+            except OSError:
+                return d, None, None
+            if not full and known_mtimes.get(d) == mtime:
+                return d, mtime, None
+            try:
+                return d, *catalog_scan_dir(d)
+            except OSError:
+                return d, None, None
+
+        # Walk roots level by level, scanning changed directories in parallel
+        visited = set()
+        frontier = roots
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while frontier:
+                next_frontier = []
+                for d, mtime, rows in executor.map(visit, frontier):
+                    if mtime is None:
+                        continue  # Directory is gone or unreadable
+                    visited.add(d)
+                    if rows is None:
+                        # Unchanged: descend into subdirectories on record
+                        subdirs = [
+                            p for p, in con.execute(
+                                "SELECT path FROM entries"
+                                " WHERE dir = ? AND type = 'd'",
+                                (d,),
+                            )
+                        ]
+                    else:
+                        con.execute("DELETE FROM entries WHERE dir = ?", (d,))
+                        con.executemany(
+                            "INSERT INTO entries"
+                            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            rows,
+                        )
+                        con.execute(
+                            "INSERT OR REPLACE INTO dirs VALUES (?, ?)",
+                            (d, mtime),
+                        )
+                        subdirs = [r[0] for r in rows if r[4] == 'd']
+                    next_frontier += subdirs
+                frontier = next_frontier
+
+        # Forget directories under roots that no longer exist
+        for d in known_mtimes:
+            under_root = any(
+                d == r or d.startswith(r.rstrip('/') + '/') for r in roots
+            )
+            if under_root and d not in visited:
+                con.execute("DELETE FROM dirs WHERE path = ?", (d,))
+                con.execute("DELETE FROM entries WHERE dir = ?", (d,))
+
+
+def catalog_query(
+    db_path: Path,
+    glob: str = None,
+    regex: str | re.Pattern = None,
+    ext: str | list[str] = None,
+    kind: str = None,
+    under: list[Path] = None,
+    result_type: set[str] = None,
+    relative_to: list[Path] = None,
+) -> Iterator[Path]:
+    """Look up files in a file catalog (see catalog_refresh).
+
+    Filters are combined: "glob" (SQLite GLOB, case-sensitive) and "regex"
+    are matched against file names, "ext" against lowercase extensions
+    (e.g. '.tif'), "kind" against the file kind, "under" restricts results
+    to the given directory trees and "result_type" to fd-style types (f, d,
+    l, x, e). Paths under a "relative_to" directory are returned joined to
+    it as given (like find); others are returned absolute.
+    """
+
+    where, params = [], []
+    if glob:
+        where.append("name GLOB ?")
+        params.append(glob)
+    if isinstance(regex, re.Pattern):
+        if regex.flags & re.IGNORECASE:
+            regex = f"(?i:{regex.pattern})"
+        else:
+            regex = regex.pattern
+    if regex:
+        where.append("name REGEXP ?")
+        params.append(regex)
+    if ext:
+        exts = [ext] if isinstance(ext, str) else list(ext)
+        where.append(f"ext IN ({', '.join('?' * len(exts))})")
+        params += [e.lower() for e in exts]
+    if kind:
+        where.append("kind = ?")
+        params.append(kind)
+    if under:
+        # Range scans on the path index
+        trees = []
+        for d in under:
+            d = os.path.abspath(d).rstrip('/')
+            trees.append("(path > ? AND path < ?)")
+            params += [d + '/', d + '0']  # '0' sorts right after '/'
+        where.append(f"({' OR '.join(trees)})")
+    if result_type:
+        types = set(result_type) & {'f', 'd', 'l'}
+        if 'x' in result_type or 'e' in result_type:
+            types |= {'f', 'd'}
+        where.append(f"type IN ({', '.join('?' * len(types))})")
+        params += sorted(types)
+
+    sql = "SELECT path, type, size FROM entries"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+
+    prefixes = [
+        (os.path.abspath(d).rstrip('/') + '/', d) for d in relative_to or []
+    ]
+
+    with closing(catalog_connect(db_path)) as con:
+        for path, kind_type, size in con.execute(sql, params):
+            # Check types that need the file system
+            if result_type and kind_type not in result_type:
+                is_exec = (
+                    'x' in result_type
+                    and kind_type == 'f'
+                    and os.access(path, os.X_OK)
+                )
+                is_empty = 'e' in result_type and (
+                    size == 0 if kind_type == 'f' else not os.listdir(path)
+                )
+                if not (is_exec or is_empty):
+                    continue
+
+            for prefix, d in prefixes:
+                if path.startswith(prefix):
+                    yield Path(d, path[len(prefix):])
+                    break
+            else:
+                yield Path(path)
+
+
+def vsimem_path(value) -> str | None:
+    """Return the GDAL in-memory path of a raster argument, if it has one.
+
+    "value" may be a "/vsimem/" path or an object named by one (such as a
+    rasterio MemoryFile). Return None for anything else.
+    """
+
+    if isinstance(value, (str, Path)):
+        name = str(value)
+    else:
+        name = getattr(value, 'name', None)
+    if isinstance(name, str) and name.startswith('/vsimem/'):
+        return name
+
+    return None
 
 
 def get_path_stem(path: Path) -> str:
@@ -526,25 +1008,160 @@ def get_path_stem(path: Path) -> str:
         path = path_stem
 
 
+def read_las_header(las_path: Path) -> dict:
+    """Read the public header block and (E)VLRs of a LAS/LAZ file.
+
+    Only the uncompressed header portion of the file is read, so this works
+    for LAS, LAZ and COPC alike. Returns a dict with the header fields along
+    with the CRS found in the OGC WKT or GeoTIFF GeoKey VLRs (if any).
+    """
+
+    with open(las_path, 'rb') as f:
+        head = f.read(375)
+        if head[:4] != b'LASF':
+            raise ValueError("Not a LAS/LAZ file:", las_path)
+
+        # Parse public header block (LAS 1.0-1.4)
+        ver_major, ver_minor = struct.unpack_from('<BB', head, 24)
+        creation_doy, creation_year, header_size = struct.unpack_from(
+            '<HHH', head, 90,
+        )
+        point_data_offset, vlr_count = struct.unpack_from('<II', head, 96)
+        point_format, point_record_len = struct.unpack_from('<BH', head, 104)
+        legacy_count, = struct.unpack_from('<I', head, 107)
+        legacy_count_by_return = struct.unpack_from('<5I', head, 111)
+        scale = struct.unpack_from('<3d', head, 131)
+        offset = struct.unpack_from('<3d', head, 155)
+        max_x, min_x, max_y, min_y, max_z, min_z = struct.unpack_from(
+            '<6d', head, 179,
+        )
+        header = {
+            'version': (ver_major, ver_minor),
+            'creation_doy': creation_doy,
+            'creation_year': creation_year,
+            'header_size': header_size,
+            'point_data_offset': point_data_offset,
+            'point_format': point_format & 0x3F,
+            'compressed': bool(point_format & 0x80),
+            'point_record_len': point_record_len,
+            'point_count': legacy_count,
+            'point_count_by_return': legacy_count_by_return,
+            'scale': scale,
+            'offset': offset,
+            'min': (min_x, min_y, min_z),
+            'max': (max_x, max_y, max_z),
+            'evlr_offset': 0,
+            'evlr_count': 0,
+        }
+
+        # LAS 1.4 stores 64-bit point counts and EVLR locations
+        if (ver_major, ver_minor) >= (1, 4) and header_size >= 375:
+            evlr_offset, evlr_count, point_count = struct.unpack_from(
+                '<QIQ', head, 235,
+            )
+            header['evlr_offset'] = evlr_offset
+            header['evlr_count'] = evlr_count
+            header['point_count'] = point_count
+            header['point_count_by_return'] = struct.unpack_from(
+                '<15Q', head, 255,
+            )
+
+        # Read variable length records
+        vlrs = []
+        f.seek(header_size)
+        for _ in range(vlr_count):
+            _, user_id, record_id, length = struct.unpack(
+                '<H16sHH', f.read(22),
+            )
+            f.seek(32, os.SEEK_CUR)  # Skip description
+            vlrs.append((user_id.rstrip(b'\0'), record_id, f.read(length)))
+
+        # Read extended variable length records
+        if header['evlr_count']:
+            f.seek(header['evlr_offset'])
+            for _ in range(header['evlr_count']):
+                _, user_id, record_id, length = struct.unpack(
+                    '<H16sHQ', f.read(28),
+                )
+                f.seek(32, os.SEEK_CUR)  # Skip description
+                vlrs.append(
+                    (user_id.rstrip(b'\0'), record_id, f.read(length))
+                )
+
+    header['vlrs'] = vlrs
+
+    # Pull CRS out of projection records
+    header['wkt'] = None
+    header['epsg'] = None
+    header['vertical_epsg'] = None
+    for user_id, record_id, data in vlrs:
+        if user_id != b'LASF_Projection':
+            continue
+        if record_id == 2112:  # OGC coordinate system WKT
+            header['wkt'] = data.rstrip(b'\0').decode('utf8')
+        elif record_id == 34735:  # GeoTIFF GeoKeyDirectoryTag
+            key_count = struct.unpack_from('<4H', data)[3]
+            for i in range(key_count):
+                key_id, location, _, value = struct.unpack_from(
+                    '<4H', data, 8 + i * 8,
+                )
+                if location != 0:
+                    continue
+                if key_id in (2048, 3072) and value not in (0, 32767):
+                    # Projected CRS key overrides geographic CRS key
+                    if key_id == 3072 or header['epsg'] is None:
+                        header['epsg'] = value
+                elif key_id == 4096 and value not in (0, 32767):
+                    header['vertical_epsg'] = value
+
+    return header
+
+
 def init_logger(
-    path: Path = None, level=logging.INFO, capture_exceptions=True,
+    path: Path = None,
+    level=logging.INFO,
+    capture_exceptions=True,
+    queued=False,
+    rate: float = None,
 ) -> logging.Logger:
-    """Initialize logger, set format, and set verbosity level."""
+    """Initialize logger, set format, and set verbosity level.
+
+    With "queued", records go through a queue to a listener thread that
+    writes them in batches (see start_log_listener), and dispatch routes
+    its workers' records there too, tagged with worker PID and job ID.
+    "rate" limits repeated messages across all processes (see
+    rate_limit_filter). Calling this again in queued mode replaces the
+    previous listener and its handlers.
+    """
 
-    fmt = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
     logger = logging.getLogger()
     logger.setLevel(level)
+    fmt = logging.Formatter(QUEUE_LOG_FORMAT if queued else LOG_FORMAT)
 
     # Set logger to output to stderr
     console = logging.StreamHandler()
     console.setFormatter(fmt)
-    logger.addHandler(console)
+    handlers = [console]
 
     # Set logger to output to a file as well
     if path:
         file = logging.FileHandler(path, mode='a')
         file.setFormatter(fmt)
-        logger.addHandler(file)
+        handlers.append(file)
+
+    # Either attach handlers directly or behind a queue listener
+    if queued:
+        stop_log_listener(reattach=False)
+        for handler in handlers:
+            handler.addFilter(log_context)
+        LOG_LISTENER.update(start_log_listener(handlers, rate=rate))
+        LOG_LISTENER['queue_handler'] = queue_handler(LOG_LISTENER['queue'])
+        logger.addHandler(LOG_LISTENER['queue_handler'])
+        atexit.unregister(stop_log_listener)  # Only register once
+        atexit.register(stop_log_listener)
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
 
     # Capture unhandled exceptions
     if capture_exceptions:
@@ -555,6 +1172,207 @@ def init_logger(
     return logger
 
 
+def log_context(record: logging.LogRecord) -> bool:
+    """Logging filter tagging records with the current dispatch job ID."""
+
+    if not hasattr(record, 'job_id'):
+        record.job_id = LOG_JOB_ID.get()
+
+    return True
+
+
+def log_template(record: logging.LogRecord) -> bool:
+    """Logging filter keeping the record's unformatted message template.
+
+    QueueHandler merges the arguments into the message before queueing,
+    so filters on the listener side (see rate_limit_filter) find the
+    template in "msg_template" instead.
+    """
+
+    if not hasattr(record, 'msg_template'):
+        record.msg_template = str(record.msg)
+
+    return True
+
+
+def rate_limit_filter(rate=10.0, burst=50) -> Callable:
+    """Make a logging filter limiting how often a message may repeat.
+
+    Each message template (per logger; for queued records, as kept by
+    log_template) gets a token bucket refilled at "rate" records per
+    second, holding up to "burst". Records beyond that are dropped; the
+    next record let through notes how many were suppressed. Warnings and
+    errors always pass. The filter's "drain"
+    attribute returns notice records for messages with suppressed records
+    not yet noted (see start_log_listener, which emits them on flush). The
+    decision is stored on the record, so one filter can be shared by
+    several handlers.
+    """
+
+    buckets = {}
+    lock = threading.Lock()
+
+    def rate_limit(record):
+        if hasattr(record, 'rate_ok'):
+            return record.rate_ok
+        record.rate_ok = True
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, getattr(record, 'msg_template', record.msg))
+        now = time.monotonic()
+        with lock:
+            tokens, last, dropped, _ = buckets.get(key, (burst, now, 0, None))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens < 1:
+                buckets[key] = (tokens, now, dropped + 1, record)
+                record.rate_ok = False
+                return False
+            buckets[key] = (tokens - 1, now, 0, None)
+        if dropped:
+            record.msg = f"{record.msg} [{dropped} similar suppressed]"
+
+        return True
+
+    def drain():
+        notices = []
+        with lock:
+            for key, (tokens, last, dropped, record) in buckets.items():
+                if not dropped:
+                    continue
+                buckets[key] = (tokens, last, 0, None)
+                notice = logging.makeLogRecord(record.__dict__)
+                notice.msg = f"{record.msg} [{dropped} similar suppressed]"
+                notice.rate_ok = True
+                notices.append(notice)
+
+        return notices
+
+    rate_limit.drain = drain
+
+    return rate_limit
+
+
+def queue_handler(log_queue) -> logging.Handler:
+    """Make a handler sending records (tagged with job ID) to a queue."""
+
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.addFilter(log_context)
+    handler.addFilter(log_template)
+
+    return handler
+
+
+def start_log_listener(
+    handlers: list[logging.Handler],
+    batch_size=256,
+    flush_interval=1.0,
+    rate: float = None,
+) -> dict:
+    """Start a thread writing queued log records to the given handlers.
+
+    Records are buffered and handed to each handler in batches of up to
+    "batch_size" records, at least every "flush_interval" seconds (and
+    immediately for errors), so file writes do not happen per record.
+    With "rate", records are rate limited here, across all processes
+    logging to the queue (see rate_limit_filter); notices of suppressed
+    records are written on every flush. Returns the listener record; its
+    "queue" is a multiprocessing queue that can be passed to worker
+    processes (see init_worker_logging).
+    """
+
+    # Buffer handlers, sharing one rate limiter
+    buffered = [
+        logging.handlers.MemoryHandler(
+            batch_size, flushLevel=logging.ERROR, target=h,
+        )
+        for h in handlers
+    ]
+    rate_limit = rate_limit_filter(rate) if rate else None
+    if rate_limit:
+        for h in buffered:
+            h.addFilter(rate_limit)
+
+    # Flush handlers on a timer
+    stop = threading.Event()
+    def flush():
+        if rate_limit:
+            for notice in rate_limit.drain():
+                for h in buffered:
+                    h.handle(notice)
+        for h in buffered:
+            h.flush()
+    def flush_loop():
+        while not stop.wait(flush_interval):
+            flush()
+    flusher = threading.Thread(target=flush_loop, daemon=True)
+    flusher.start()
+
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *buffered, respect_handler_level=True,
+    )
+    listener.start()
+
+    return {
+        'queue': log_queue,
+        'listener': listener,
+        'handlers': buffered,
+        'flush': flush,
+        'flusher': flusher,
+        'stop': stop,
+    }
+
+
+def stop_log_listener(listener: dict = None, reattach=True) -> None:
+    """Stop a log listener, writing out all queued and buffered records.
+
+    Defaults to the listener started by init_logger, whose handlers are
+    then attached directly to the root logger ("reattach"), or closed and
+    dropped (not "reattach", e.g. when init_logger replaces them).
+    """
+
+    listener = listener or LOG_LISTENER
+    if not listener:
+        return
+    listener['listener'].stop()
+    listener['stop'].set()
+    listener['flusher'].join()
+    listener['flush']()
+
+    # Log directly to the handlers from now on (or drop them)
+    if listener is LOG_LISTENER:
+        logger = logging.getLogger()
+        logger.removeHandler(LOG_LISTENER['queue_handler'])
+        for h in listener['handlers']:
+            if reattach:
+                logger.addHandler(h.target)
+            else:
+                h.target.close()
+        LOG_LISTENER.clear()
+
+
+def init_worker_logging(log_queue, level=logging.INFO) -> None:
+    """Route a worker process's logging to the parent's log listener.
+
+    Used as the pool initializer by dispatch when given a log queue.
+    """
+
+    logger = logging.getLogger()
+    logger.handlers.clear()
+    logger.setLevel(level)
+    logger.addHandler(queue_handler(log_queue))
+
+
+def run_job(worker: Callable, job_id: Any, job: Any) -> Any:
+    """Run a worker on a job with the job ID set for log records."""
+
+    token = LOG_JOB_ID.set(job_id)
+    try:
+        return worker(job)
+    finally:
+        LOG_JOB_ID.reset(token)
+
+
 def papply(jobs: iter, worker: Callable, max_workers=os.cpu_count()) -> list:
     """Run jobs in parallel.
 
@@ -571,35 +1389,840 @@ def papply(jobs: iter, worker: Callable, max_workers=os.cpu_count()) -> list:
 
 
 def dispatch(
-    jobs: iter, worker: Callable, max_workers=os.cpu_count(),
+    jobs: iter, worker: Callable, max_workers=os.cpu_count(), log_queue=None,
 ) -> Iterator[(Any, Any)]:
     """Run jobs in parallel.
 
     Parallel apply dispatching function: Run a list of jobs with a given
     worker function, in parallel. Yield worker results in order they
-    finish.
+    finish. Worker log records are sent to "log_queue" (default: that of
+    init_logger(queued=True), if active), tagged with the job's index.
     """
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures_jobs = {executor.submit(worker, j): j for j in jobs}
+    if log_queue is None:
+        log_queue = LOG_LISTENER.get('queue')
+    pool_args = {}
+    if log_queue is not None:
+        worker = functools.partial(run_job, worker)
+        pool_args = {
+            'initializer': init_worker_logging,
+            'initargs': (log_queue, logging.getLogger().level),
+        }
+
+    with ProcessPoolExecutor(max_workers=max_workers, **pool_args) as executor:
+        if log_queue is not None:
+            futures_jobs = {
+                executor.submit(worker, i, j): j for i, j in enumerate(jobs)
+            }
+        else:
+            futures_jobs = {executor.submit(worker, j): j for j in jobs}
         for f in cf_as_completed(futures_jobs):
             yield (futures_jobs[f], f.result())
 
 
-def apply_naming_scheme(tif_dir: Path) -> None:
+def apply_naming_scheme(
+    tif_dir: Path, dst_dir: Path = None, dry_run=False, checksum=True,
+) -> None:
     """Organize grid metrics TIFF files.
 
     Rename and reorganize grid metrics TIFF files to conform to the naming
-    scheme the Forest Service requested.
+    scheme the Forest Service requested. The files are moved within
+    "tif_dir", or into "dst_dir" if given (see publish, which also copies
+    across file systems and writes a manifest). Being deliveries, the
+    manifest records checksums unless "checksum" is false.
+    """
+
+    records = publish(
+        tif_dir,
+        dst_dir or tif_dir,
+        NAMING_MAP,
+        dry_run=dry_run,
+        checksum=checksum,
+    )
+    for r in records:
+        if r['status'] == 'missing':
+            print("warning: File not found:", r['src'])
+        else:
+            print(r['src'], '  --->  ', r['dst'], f"({r['method']})")
+
+
+def copy_chunk(
+    src_fd: int, dst_fd: int, offset: int, length: int, checksum=False,
+) -> bytes | None:
+    """Copy one byte range between open files.
+
+    Uses copy_file_range (copying inside the kernel, or on the server for
+    network file systems that support it) and falls back to pread/pwrite.
+    With "checksum", the range is instead copied through a buffer in a
+    single pass and its BLAKE2 digest is returned.
+    """
+
+    done = 0
+    h = hashlib.blake2b() if checksum else None
+
+    # Copy range inside the kernel
+    if not checksum:
+        try:
+            while done < length:
+                n = os.copy_file_range(
+                    src_fd, dst_fd, length - done, offset + done,
+                    offset + done,
+                )
+                if n == 0:
+                    break
+                done += n
+        except (AttributeError, OSError):
+            pass  # Not supported here; copy the rest by hand
+
+    # Copy (rest of) range by hand, hashing it on the way
+    while done < length:
+        buf = os.pread(src_fd, min(length - done, 2**22), offset + done)
+        if not buf:
+            break
+        os.pwrite(dst_fd, buf, offset + done)
+        if h:
+            h.update(buf)
+        done += len(buf)
+    if done != length:
+        raise OSError("Short copy at offset:", offset)
+
+    return h.digest() if h else None
+
+
+def hash_range(fd: int, offset: int, length: int) -> bytes:
+    """Return the BLAKE2 digest of a byte range of an open file."""
+
+    h = hashlib.blake2b()
+    pos = 0
+    while pos < length:
+        buf = os.pread(fd, min(length - pos, 2**22), offset + pos)
+        if not buf:
+            raise OSError("Short read at offset:", offset + pos)
+        h.update(buf)
+        pos += len(buf)
+
+    return h.digest()
+
+
+def file_checksum(
+    path: Path, executor: ThreadPoolExecutor, chunk_size=PUBLISH_CHUNK_SIZE,
+) -> str:
+    """Compute the chunked BLAKE2 checksum of a file in parallel.
+
+    Same checksum as copy_file_chunked returns: a BLAKE2 hash over the
+    BLAKE2 digests of consecutive "chunk_size" chunks.
+    """
+
+    size = os.stat(path).st_size
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        futures = [
+            executor.submit(
+                hash_range, fd, offset, min(chunk_size, size - offset),
+            )
+            for offset in range(0, size, chunk_size)
+        ]
+        digests = [f.result() for f in futures]
+    finally:
+        os.close(fd)
+
+    return hashlib.blake2b(b''.join(digests)).hexdigest()
+
+
+def copy_file_chunked(
+    src: Path,
+    dst: Path,
+    executor: ThreadPoolExecutor,
+    chunk_size=PUBLISH_CHUNK_SIZE,
+    checksum=False,
+    verify=False,
+) -> str | None:
+    """Copy a file in parallel chunks; return its checksum if requested.
+
+    Chunks are copied on "executor" (see copy_chunk) into a temporary file
+    next to "dst", which is synced and renamed into place once every chunk
+    is copied. With "checksum", the source is hashed while it is copied
+    (see file_checksum for the checksum). With "verify" (which implies
+    "checksum"), the synced copy is dropped from the page cache and read
+    back to compare with the source digests before it is renamed into
+    place. Without either, copy_file_range can copy on the server.
+    """
+
+    checksum = checksum or verify
+    dst = Path(dst)
+    tmp_path = dst.with_name(f".{dst.name}.part")
+    size = os.stat(src).st_size
+    offsets = range(0, size, chunk_size)
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        dst_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC)
+        try:
+            os.ftruncate(dst_fd, size)
+            futures = [
+                executor.submit(
+                    copy_chunk,
+                    src_fd,
+                    dst_fd,
+                    offset,
+                    min(chunk_size, size - offset),
+                    checksum,
+                )
+                for offset in offsets
+            ]
+            digests = [f.result() for f in futures]
+            os.fsync(dst_fd)
+
+            # Read copy back from storage rather than from page cache
+            if verify:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(dst_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                futures = [
+                    executor.submit(
+                        hash_range, dst_fd, offset,
+                        min(chunk_size, size - offset),
+                    )
+                    for offset in offsets
+                ]
+                if [f.result() for f in futures] != digests:
+                    raise OSError("Checksum mismatch after copy:", dst)
+        finally:
+            os.close(dst_fd)
+        shutil.copystat(src, tmp_path)
+        tmp_path.replace(dst)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        os.close(src_fd)
+
+    if not checksum:
+        return None
+    return hashlib.blake2b(b''.join(digests)).hexdigest()
+
+
+def same_filesystem(src: Path, dst: Path) -> bool:
+    """Check if a file and a destination path share a file system.
+
+    The destination need not exist yet; its nearest existing parent is
+    checked instead.
+    """
+
+    parent = Path(dst).absolute()
+    while not parent.exists():
+        parent = parent.parent
+
+    return os.stat(src).st_dev == os.stat(parent).st_dev
+
+
+def publish_file(
+    src: Path,
+    dst: Path,
+    move: bool,
+    dry_run: bool,
+    chunk_executor: ThreadPoolExecutor,
+    chunk_size: int,
+    checksum=False,
+    verify=False,
+) -> dict:
+    """Publish one file by rename, hardlink or chunked copy (see publish).
+
+    Return a manifest record. Errors are recorded in it (status "failed")
+    rather than raised.
+    """
+
+    record = {
+        'src': str(src),
+        'dst': str(dst),
+        'method': None,
+        'bytes': None,
+        'checksum': None,
+        'status': None,
+    }
+    try:
+        if not os.path.isfile(src):
+            record['status'] = 'missing'
+            return record
+        record['bytes'] = os.stat(src).st_size
+
+        # Plan: renames and hardlinks only work within a file system
+        fast = same_filesystem(src, dst)
+        if dry_run:
+            if not fast:
+                record['method'] = 'copy'
+            else:
+                record['method'] = 'rename' if move else 'hardlink'
+            record['status'] = 'planned'
+            return record
+
+        Path(dst).parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if not fast:
+                raise OSError(errno.EXDEV, "Cross-device link", str(dst))
+            if move:
+                os.rename(src, dst)
+                record['method'] = 'rename'
+            else:
+                Path(dst).unlink(missing_ok=True)
+                os.link(src, dst)
+                record['method'] = 'hardlink'
+        except OSError as e:
+            # Different file systems (or no hardlink support): copy instead
+            if move and e.errno != errno.EXDEV:
+                raise
+            record['method'] = 'copy'
+            record['checksum'] = copy_file_chunked(
+                src, dst, chunk_executor, chunk_size, checksum, verify,
+            )
+            if move:
+                os.unlink(src)
+        else:
+            # Renamed and hardlinked files are only read if asked to
+            if checksum or verify:
+                record['checksum'] = file_checksum(
+                    dst, chunk_executor, chunk_size,
+                )
+        record['status'] = 'done'
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = f"{type(e).__name__}: {e}"
+
+    return record
+
+
+def publish(
+    src_dir: Path,
+    dst_dir: Path,
+    mapping: dict = NAMING_MAP,
+    move=True,
+    dry_run=False,
+    manifest_path: Path = None,
+    chunk_size=PUBLISH_CHUNK_SIZE,
+    max_workers: int = None,
+    checksum=False,
+    verify=False,
+) -> list[dict]:
+    """Publish files into a delivery layout.
+
+    Each "mapping" key (a path relative to "src_dir") is published to its
+    value (relative to "dst_dir"), by default NAMING_MAP. Files are first
+    renamed ("move") or hardlinked (not "move") in place, which is atomic
+    and instant within one file system; otherwise they are copied in
+    parallel chunks with copy_file_range and renamed into place (see
+    copy_file_chunked). Moved files are removed from the source only after
+    a complete copy. Files are published concurrently.
+
+    With "checksum", a checksum of every published file is recorded
+    (copies are hashed while copying, which rules out server-side
+    copy_file_range; renamed and hardlinked files are read once after
+    publishing). With "verify", copies are also read back from storage and
+    compared before they are renamed into place. Otherwise checksums are
+    null.
+
+    A JSON manifest of what was published (method, size, checksum and
+    status) is written to "manifest_path" (default PUBLISH_MANIFEST in
+    "dst_dir"), even if some files fail. An existing manifest is merged
+    into, not replaced: files published by an earlier run (and so missing
+    from "src_dir" after a move) keep their earlier record as long as the
+    published file still exists, and records of files outside "mapping"
+    are kept. With "dry_run", nothing is touched
+    and the records only tell which method would be used. Return the
+    manifest records; files missing from "src_dir" get status "missing".
+    Files that could not be published get status "failed" and an "error";
+    if there are any, OSError is raised after the manifest is written.
+    """
+
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+    pairs = [
+        (Path(src_dir, src), Path(dst_dir, dst))
+        for src, dst in mapping.items()
+    ]
+    with (
+        ThreadPoolExecutor(max_workers=max_workers) as file_executor,
+        ThreadPoolExecutor(max_workers=max_workers) as chunk_executor,
+    ):
+        records = list(file_executor.map(
+            lambda pair: publish_file(
+                *pair, move, dry_run, chunk_executor, chunk_size,
+                checksum, verify,
+            ),
+            pairs,
+        ))
+
+    # Merge with records of earlier runs
+    if manifest_path is None:
+        manifest_path = Path(dst_dir, PUBLISH_MANIFEST)
+    try:
+        with Path(manifest_path).open('r') as f:
+            old = {r['dst']: r for r in json.load(f)['files']}
+    except (OSError, ValueError, KeyError, TypeError):
+        old = {}
+    for i, r in enumerate(records):
+        prev = old.pop(r['dst'], None)
+        if (
+            r['status'] == 'missing'
+            and prev is not None
+            and prev.get('status') == 'done'
+            and os.path.isfile(r['dst'])
+        ):
+            records[i] = prev
+
+    # Save manifest
+    if not dry_run:
+        Path(manifest_path).parent.mkdir(parents=True, exist_ok=True)
+        with Path(manifest_path).open('w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'src_dir': str(src_dir),
+                'dst_dir': str(dst_dir),
+                'files': records + list(old.values()),
+            }, f, indent=2)
+
+    # Report failures once every file has been attempted
+    failed = [r for r in records if r['status'] == 'failed']
+    if failed:
+        raise OSError(
+            f"Failed to publish {len(failed)} file(s):",
+            [(r['src'], r['error']) for r in failed],
+        )
+
+    return records
+
+
+def set_file_cache(cache_dir: Path = None, max_bytes: int = None) -> None:
+    """Configure (or with no "cache_dir", disable) the memoize_files cache.
+
+    The cache can also be configured with the VOGELER_CACHE_DIR and
+    VOGELER_CACHE_MAX_BYTES environment variables, which, unlike this
+    function, also reach worker processes.
+    """
+
+    global FILE_CACHE_DIR, FILE_CACHE_MAX_BYTES
+
+    FILE_CACHE_DIR = cache_dir
+    if max_bytes is not None:
+        FILE_CACHE_MAX_BYTES = max_bytes
+
+
+def file_fingerprint(path: Path, hash_head=False) -> list:
+    """Fingerprint a file by size and mtime (and optionally content).
+
+    With "hash_head", a BLAKE2 hash of the first and last 64 KiB (where
+    headers and tile indexes live) is included too. Directories are
+    fingerprinted by their (non-hidden) files, and VRTs include their
+    source rasters.
+    """
+
+    path = Path(path)
+    if path.is_dir():
+        return [
+            [p.name, file_fingerprint(p, hash_head)]
+            for p in sorted(lsdir(path)) if p.is_file()
+        ]
+
+    st = path.stat()
+    fingerprint = [st.st_size, st.st_mtime_ns]
+    if hash_head:
+        h = hashlib.blake2b()
+        with path.open('rb') as f:
+            h.update(f.read(2**16))
+            if st.st_size > 2**17:
+                f.seek(-2**16, os.SEEK_END)
+            h.update(f.read(2**16))
+        fingerprint.append(h.hexdigest())
+
+    # Include VRT sources
+    if path.suffix.lower() == '.vrt':
+        for elem in ET.parse(path).getroot().iter('SourceFilename'):
+            src = Path(elem.text)
+            if elem.get('relativeToVRT') == '1':
+                src = path.parent / src
+            if src.exists():
+                fingerprint.append(file_fingerprint(src, hash_head))
+
+    return fingerprint
+
+
+def memoize_key(value, hash_head=False) -> Any:
+    """Turn a function argument into a JSON-able cache key component.
+
+    Paths to existing files are replaced by their fingerprints; geometries
+    and data frames by their WKB or JSON serialization.
     """
 
-    for src_name in NAMING_MAP:
-        src_tif = Path(tif_dir, src_name)
-        dst_tif = Path(tif_dir, NAMING_MAP[src_name])
-        dst_tif.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(value, (list, tuple, set)):
+        return [memoize_key(v, hash_head) for v in value]
+    if isinstance(value, dict):
+        return {str(k): memoize_key(v, hash_head) for k, v in value.items()}
+    if isinstance(value, (str, Path)) and os.path.exists(value):
+        return ['file', str(value), file_fingerprint(value, hash_head)]
+    if hasattr(value, 'wkb'):
+        return value.wkb.hex()
+    if hasattr(value, 'to_json'):
+        return value.to_json()
+    if isinstance(value, (int, float, bool, type(None))):
+        return value
+
+    return repr(value)
+
+
+def has_vsimem(value) -> bool:
+    """Tell if an argument is, or contains, a GDAL in-memory dataset."""
+
+    if isinstance(value, (list, tuple, set)):
+        return any(has_vsimem(v) for v in value)
+    if isinstance(value, dict):
+        return any(has_vsimem(v) for v in value.values())
+
+    return vsimem_path(value) is not None
+
+
+def memoize_outputs(path: Path) -> list[Path]:
+    """List the files making up an output (shapefiles have sidecars)."""
+
+    path = Path(path)
+    paths = [path]
+    if path.suffix.lower() == '.shp':
+        paths += [
+            path.with_suffix(e) for e in SHP_SIDECAR_EXTS
+            if path.with_suffix(e).exists()
+        ]
+
+    return paths
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hardlink a file, falling back to a copy across file systems."""
+
+    Path(dst).unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def evict_file_cache(cache_dir: Path, max_bytes: int) -> None:
+    """Delete least recently used cache entries until under "max_bytes"."""
+
+    entries = []
+    for manifest in Path(cache_dir).glob('*/manifest.json'):
+        if manifest.parent.name.startswith('.'):
+            continue  # Entry still being stored
         try:
-            src_tif.rename(dst_tif)
-        except FileNotFoundError:
-            print("warning: File not found:", src_tif)
+            with manifest.open('r') as f:
+                size = json.load(f)['bytes']
+            entries.append((manifest.stat().st_mtime, size, manifest.parent))
+        except (OSError, ValueError, KeyError):
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+def memoize_files(*out_args: str, hash_head=False) -> Callable:
+    """Cache the outputs of a path-in/path-out function.
+
+    Decorator for functions that read input files and write output files.
+    "out_args" name the parameters holding output paths (a path or a list
+    of paths). The cache key is built from the function name, the
+    fingerprints of all other arguments that are existing files (see
+    file_fingerprint) and the remaining argument values. On a hit, cached
+    outputs are hardlinked (or copied) to the requested paths and the
+    function is skipped; if the output already is the cached file, nothing
+    is done at all. Results are stored in FILE_CACHE_DIR with a JSON
+    manifest; the cache is trimmed to FILE_CACHE_MAX_BYTES by least recent
+    use. Caching is off while FILE_CACHE_DIR is unset (see set_file_cache).
+    """
+
+    def decorator(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not FILE_CACHE_DIR:
+                return fn(*args, **kwargs)
+            cache_dir = Path(FILE_CACHE_DIR)
+
+            # In-memory datasets can not be fingerprinted or linked
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if has_vsimem(list(bound.arguments.values())):
+                return fn(*args, **kwargs)
+
+            # Split arguments into outputs and key material
+            outputs, params = {}, {}
+            for name, value in bound.arguments.items():
+                if name in out_args:
+                    is_list = isinstance(value, (list, tuple))
+                    outputs[name] = list(value) if is_list else [value]
+                else:
+                    params[name] = memoize_key(value, hash_head)
+            key = hashlib.sha256(json.dumps(
+                [fn.__module__, fn.__qualname__, params], sort_keys=True,
+            ).encode()).hexdigest()
+            entry = cache_dir / key
+            manifest_path = entry / 'manifest.json'
+
+            # On hit, verify cached files are intact, then materialize them
+            if manifest_path.exists():
+                with manifest_path.open('r') as f:
+                    manifest = json.load(f)
+                files = manifest['files']
+                intact = all(
+                    Path(entry, c).exists()
+                    and list(file_fingerprint(Path(entry, c))) == fp
+                    for c, _, _, fp in files
+                )
+                if intact:
+                    for cached, arg, i, _ in files:
+                        dst = Path(outputs[arg][i])
+                        if Path(cached).suffix != dst.suffix:  # Sidecar
+                            dst = dst.with_suffix(Path(cached).suffix)
+                        src = Path(entry, cached)
+                        if not (dst.exists() and dst.samefile(src)):
+                            link_or_copy(src, dst)
+                    manifest_path.touch()  # Mark as recently used
+                    return manifest['result']
+                shutil.rmtree(entry, ignore_errors=True)
+
+            result = fn(*args, **kwargs)
+
+            # Only results that survive a JSON round trip can be cached
+            try:
+                json.dumps(result)
+            except TypeError:
+                return result
+
+            # Store outputs in cache atomically (staging directory is unique
+            # to this call, so threads and processes do not collide)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_entry = Path(mkdtemp(prefix=f".{key}.", dir=cache_dir))
+            files, size = [], 0
+            for arg, paths in outputs.items():
+                for i, out_path in enumerate(paths):
+                    for p in memoize_outputs(out_path):
+                        if not p.is_file():
+                            continue
+                        cached = f"{arg}.{i}{p.suffix}"
+                        link_or_copy(p, tmp_entry / cached)
+                        fp = file_fingerprint(tmp_entry / cached)
+                        files.append([cached, arg, i, fp])
+                        size += fp[0]
+            with (tmp_entry / 'manifest.json').open('w') as f:
+                json.dump({
+                    'function': f"{fn.__module__}.{fn.__qualname__}",
+                    'params': params,
+                    'files': files,
+                    'result': result,
+                    'bytes': size,
+                }, f)
+            try:
+                tmp_entry.rename(entry)
+            except OSError:
+                shutil.rmtree(tmp_entry)  # Another process stored it first
+            evict_file_cache(cache_dir, FILE_CACHE_MAX_BYTES)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def newest_mtime(paths: list[Path]) -> float:
+    """Return the newest mtime among paths (directories are searched)."""
+
+    mtimes = [0.0]
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                mtimes += [os.stat(Path(root, f)).st_mtime for f in files]
+        else:
+            mtimes.append(os.stat(path).st_mtime)
+
+    return max(mtimes)
+
+
+def pipeline_graph(stages: list[dict]) -> dict[str, set]:
+    """Map each pipeline stage name to the names of stages it depends on.
+
+    A stage depends on every stage that produces one of its inputs, plus
+    any stages listed under its "after" key. Raise ValueError on duplicate
+    names, unknown "after" names, or dependency cycles.
+    """
+
+    # Index outputs by producing stage
+    producers, names = {}, set()
+    for stage in stages:
+        if stage['name'] in names:
+            raise ValueError("Duplicate stage name:", stage['name'])
+        names.add(stage['name'])
+        for out_path in stage.get('outputs', []):
+            producers[str(out_path)] = stage['name']
+
+    graph = {}
+    for stage in stages:
+        deps = set(stage.get('after', []))
+        if deps - names:
+            raise ValueError("Unknown stage:", deps - names)
+        deps |= {
+            producers[str(p)] for p in stage.get('inputs', [])
+            if str(p) in producers
+        }
+        deps.discard(stage['name'])
+        graph[stage['name']] = deps
+
+    # Check for cycles by peeling off stages with no pending dependencies
+    pending = {name: set(deps) for name, deps in graph.items()}
+    while pending:
+        ready = [name for name, deps in pending.items() if not deps]
+        if not ready:
+            raise ValueError("Dependency cycle among stages:", list(pending))
+        for name in ready:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+
+    return graph
+
+
+def pipeline_plan(stages: list[dict], force=False) -> list[dict]:
+    """Decide which pipeline stages must run.
+
+    Return one record per stage, in dependency order, with the stage
+    name, whether it will run, and why. Like make, a stage is stale when
+    an output is missing or older than its newest input, or when a stage
+    it depends on is stale. With "force", every stage runs.
+    """
+
+    graph = pipeline_graph(stages)
+    by_name = {stage['name']: stage for stage in stages}
+
+    # Order stages so dependencies come first
+    order, done = [], set()
+    while len(order) < len(stages):
+        for stage in stages:
+            name = stage['name']
+            if name not in done and graph[name] <= done:
+                order.append(name)
+                done.add(name)
+
+    plan, stale = [], set()
+    for name in order:
+        stage = by_name[name]
+        inputs = stage.get('inputs', [])
+        outputs = stage.get('outputs', [])
+        missing = [p for p in inputs if not os.path.exists(p)]
+        stale_deps = sorted(graph[name] & stale)
+        if force:
+            reason = "forced"
+        elif stale_deps:
+            reason = f"upstream stale: {', '.join(stale_deps)}"
+        elif not outputs:
+            reason = "no outputs declared"
+        elif not all(os.path.exists(p) for p in outputs):
+            reason = "output missing"
+        elif missing:
+            reason = None  # Outputs exist; nothing upstream will rebuild it
+        elif newest_mtime(inputs) > min(
+            newest_mtime([p]) for p in outputs
+        ):
+            reason = "inputs newer than outputs"
         else:
-            print(src_tif, '  --->  ', dst_tif)
+            reason = None
+        if reason:
+            stale.add(name)
+        plan.append({
+            'name': name,
+            'run': bool(reason),
+            'reason': reason or "up to date",
+            'deps': sorted(graph[name]),
+        })
+
+    return plan
+
+
+def run_pipeline(
+    stages: list[dict],
+    max_workers=os.cpu_count(),
+    executor=None,
+    dry_run=False,
+    force=False,
+) -> dict[str, Any]:
+    """Run a make-style pipeline of stages.
+
+    Each stage is a dict with a unique "name", a callable "fn" (called as
+    fn(*args, **kwargs) using the stage's optional "args" and "kwargs"),
+    and lists of "inputs" and "outputs" paths; "after" optionally names
+    stages to wait for. Dependencies are inferred from inputs matching
+    other stages' outputs. Stages that are up to date (see pipeline_plan)
+    are skipped and independent branches run concurrently on "executor"
+    (a thread pool of "max_workers" by default). With "dry_run", print the
+    execution plan and run nothing.
+
+    Return a dict mapping stage names to results. If a stage raises, its
+    dependents are not started, running stages are finished, and the
+    first error is re-raised.
+    """
+
+    plan = pipeline_plan(stages, force)
+    if dry_run:
+        for step in plan:
+            action = "run " if step['run'] else "skip"
+            print(f"{action}  {step['name']}  ({step['reason']})")
+        return {}
+
+    by_name = {stage['name']: stage for stage in stages}
+    deps = {step['name']: set(step['deps']) for step in plan}
+    todo = [step['name'] for step in plan if step['run']]
+    done = {step['name'] for step in plan if not step['run']}
+    results = {}
+    error = None
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        running = {}
+        while todo or running:
+            # Submit every stage whose dependencies have finished
+            if error is None:
+                for name in [n for n in todo if deps[n] <= done]:
+                    stage = by_name[name]
+                    for out_path in stage.get('outputs', []):
+                        Path(out_path).parent.mkdir(
+                            parents=True, exist_ok=True
+                        )
+                    future = executor.submit(
+                        stage['fn'],
+                        *stage.get('args', []),
+                        **stage.get('kwargs', {}),
+                    )
+                    running[future] = name
+                    todo.remove(name)
+            if not running:
+                break
+
+            # Wait for a stage to finish
+            finished, _ = cf_wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    error = error or e
+                else:
+                    done.add(name)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    if error is not None:
+        raise error
+
+    return results
+